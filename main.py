@@ -1,6 +1,8 @@
 import streamlit as st
 import src.Pages.auth as auth
 from src.Utils.chat_backend import load_past_chats
+from src.Utils.lazy_init import start_warmup
+from src.Utils.rag_app import start_metrics_log, warm_up
 import requests
 from io import BytesIO
 
@@ -70,4 +72,12 @@ reports_page = st.Page(
 )
 
 pg = st.navigation([dashboard_page, chat_page, history_page, reports_page, loc_app_doc_page])
-pg.run()
\ No newline at end of file
+pg.run()
+
+# Load the embedding model, vector store and LLM clients in the background
+# once the first page is on screen (no-op after the first run per process)
+start_warmup(*warm_up())
+
+# Per-model latency and tokens, routing, cache and queue stats, logged every
+# METRICS_LOG_INTERVAL_S (no-op after the first run per process)
+start_metrics_log()
@@ -0,0 +1,23 @@
+-- Chat storage used by src/Utils/chat_backend.py.
+-- Run once in the Supabase SQL editor; every statement is idempotent.
+
+-- One row per turn; rows are only ever appended
+create table if not exists chat_messages (
+    id bigint generated always as identity primary key,
+    email text not null,
+    chat_id bigint not null,
+    seq integer not null,
+    user_message text not null,
+    llm_response text not null,
+    created_at timestamptz not null default now(),
+    unique (email, chat_id, seq)
+);
+
+-- Per-chat metadata: turns stored so far (guards against out-of-order
+-- metadata writes) and the soft-delete marker
+alter table all_chats add column if not exists message_count integer;
+alter table all_chats add column if not exists deleted_at timestamptz;
+
+-- Upsert targets (on_conflict="email,chat_id")
+create unique index if not exists all_chats_email_chat_id_key on all_chats (email, chat_id);
+create unique index if not exists user_chat_nums_email_chat_id_key on user_chat_nums (email, chat_id);
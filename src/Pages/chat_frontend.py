@@ -1,6 +1,8 @@
 import streamlit as st
 from streamlit_chat import message
-from src.Utils.chat_backend import update_chat, on_input_change, on_btn_click
+from src.Utils.chat_backend import update_chat, on_input_change, on_btn_click, stream_pending_answer
+from src.Utils.admission import current_user
+from src.Utils.user_docs import index_upload, user_docs
 
 img1="https://imgs.search.brave.com/pWwhW0HerlZ2C1HHMnEiRrVIU76w2o8CLiXILkxMedc/rs:fit:860:0:0:0/g:ce/aHR0cHM6Ly9pLnBp/bmltZy5jb20vb3Jp/Z2luYWxzL2ZjLzgy/LzViL2ZjODI1YmE4/ODE3NjA5NzMxY2Mz/MzE2NjliZmUzNTc3/LmpwZw"
 img2="https://imgs.search.brave.com/wVPMe1LUk2ORYXfAcvjE54bV_c-SgqORRIxtX9tF2GU/rs:fit:860:0:0:0/g:ce/aHR0cHM6Ly9wbGF5/LWxoLmdvb2dsZXVz/ZXJjb250ZW50LmNv/bS9wcm94eS8wNl94/R0ZmR2xRSGt3YzNN/MXpiVGhyZ1ZfelVL/QzRxWkpfNEtuQmt6/M240elY0eGNtcG5k/RjdxUzQ5TmdLYUJM/a3lMRnpPQkwxZi1K/a3Fvc0d6VG8weUwx/VktuVFhQXzZuNUQ5/bWVPRUh2Ml9YcE9L/X1h3a1o5OD1zMTky/MC13MTkyMC1oMTA4/MA"
@@ -23,7 +25,7 @@ def render():
     # 1. Chat Display Area
     chat_placeholder = st.container()
     with chat_placeholder:
-        if len(st.session_state.chat_id[st.session_state.current_chat_id]["user_messages"]) == 0:
+        if len(st.session_state.chat_id[st.session_state.current_chat_id]["user_messages"]) == 0 and not st.session_state.get("pending_query"):
             st.title("Hi! How can I help you today?", text_alignment='center')
 
         for i in range(len(st.session_state.chat_id[st.session_state.current_chat_id]["user_messages"])):
@@ -40,7 +42,36 @@ def render():
                 logo=img2,
             )
 
-    # 2. Chat Input Area at Bottom
+        # A message refused by the rate limit or a full queue isn't kept
+        notice = st.session_state.pop("admission_notice", None)
+        if notice:
+            st.warning(notice)
+
+        # Stream the answer to a just-sent message, then redraw the history
+        if st.session_state.get("pending_query"):
+            i = len(st.session_state.chat_id[st.session_state.current_chat_id]["user_messages"])
+            message(
+                st.session_state.pending_query,
+                is_user=True,
+                logo=img1,
+                key=f"{i}_user_pending"
+            )
+            with st.chat_message("assistant", avatar=img2):
+                queue_status = st.empty()
+
+                def show_queue(position):
+                    if position:
+                        queue_status.caption(f"⏳ Waiting for the assistant (position {position} in queue)")
+                    else:
+                        queue_status.empty()
+
+                st.write_stream(stream_pending_answer(on_queue=show_queue))
+            st.rerun()
+
+    # 2. The user's own runbooks and logs, searched alongside the docs
+    render_user_docs()
+
+    # 3. Chat Input Area at Bottom
     with st.container():
         st.text_area(
             "User Input:",
@@ -60,5 +91,38 @@ def render():
                 st.button("Clear chat", on_click=on_btn_click)
 
 
+def render_user_docs():
+    user = current_user()
+    if user == "anonymous":
+        return
+    with st.expander("📎 Your documents"):
+        uploads = st.file_uploader(
+            "Attach runbooks or logs",
+            type=["txt", "md", "log", "json", "conf", "cfg", "ini", "sh", "yaml", "yml"],
+            accept_multiple_files=True,
+            key="user_doc_uploads",
+        )
+        indexed = st.session_state.setdefault("indexed_uploads", set())
+        for upload in uploads or []:
+            if upload.file_id in indexed:
+                continue
+            try:
+                with st.spinner(f"Indexing {upload.name}..."):
+                    index_upload(user, upload.name, upload.getvalue())
+                indexed.add(upload.file_id)
+                st.toast(f"Indexed {upload.name}", icon="✅")
+            except ValueError as e:
+                st.error(str(e))
+            except Exception as e:
+                st.error(f"Could not index {upload.name}: {e}")
+
+        for name in user_docs.documents(user):
+            col1, col2 = st.columns([5, 1])
+            col1.write(name)
+            if col2.button("Remove", key=f"remove_doc_{name}"):
+                user_docs.remove(user, name)
+                st.rerun()
+
+
 if __name__ == "__main__":
     render()
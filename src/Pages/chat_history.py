@@ -112,9 +112,13 @@ def delete_chat():
     # 5. Action button
     if st.session_state.selected_chat_ids:
         if st.button(f"Delete {len(st.session_state.selected_chat_ids)} Selected Chats", type="primary"):
-            manage_deletes()
-            st.toast(f"Deleted IDs: {st.session_state.selected_chat_ids}", icon='✅')
-            st.rerun()
+            result = manage_deletes()
+            if result["deleted"]:
+                st.toast(f"Deleted IDs: {result['deleted']}", icon='✅')
+            if result["failed"]:
+                st.error(f"Some chats could not be deleted: {result['failed']}")
+            else:
+                st.rerun()
 
 
 def render():
@@ -0,0 +1,172 @@
+# admission.py
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import streamlit as st
+
+from src.Utils.rag_config import (
+    ADMISSION_MAX_WAIT,
+    ADMISSION_SHED_DEPTH,
+    LLM_MAX_CONCURRENT,
+    USER_BURST,
+    USER_RATE_PER_MIN,
+)
+
+
+class AdmissionError(RuntimeError):
+    pass
+
+
+def current_user() -> str:
+    try:
+        return st.user.get("email", "") or "anonymous"
+    except Exception:
+        return "anonymous"
+
+
+class _Ticket:
+    def __init__(self, user):
+        self.user = user
+        self.granted = False
+        self.shed = False
+
+
+class AdmissionController:
+    """
+    Gate in front of every model call.
+
+    Each user has a token bucket (USER_RATE_PER_MIN, USER_BURST). Admitted
+    calls then wait for one of LLM_MAX_CONCURRENT slots, handed out round-robin
+    across users so one busy user can't starve the rest. Calls that arrive
+    while the queue is deeper than ADMISSION_SHED_DEPTH are marked shed and
+    should run on the smaller model.
+    """
+
+    def __init__(self, max_concurrent=LLM_MAX_CONCURRENT, rate_per_min=USER_RATE_PER_MIN,
+                 burst=USER_BURST, shed_depth=ADMISSION_SHED_DEPTH, max_wait=ADMISSION_MAX_WAIT):
+        self.max_concurrent = max_concurrent
+        self.rate = rate_per_min / 60.0
+        self.burst = burst
+        self.shed_depth = shed_depth
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        self._active = 0
+        self._queues = {}  # user -> deque of waiting tickets
+        self._turns = deque()  # users with waiting tickets, in serving order
+        self._buckets = {}  # user -> [tokens, last_refill]
+
+    def _take_token(self, user, max_delay: float):
+        """
+        Reserve a token for user; returns how long to wait before it is valid,
+        or None (leaving the bucket untouched) if that would exceed max_delay.
+        """
+        now = time.monotonic()
+        tokens, last = self._buckets.get(user, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate) - 1
+        delay = 0.0 if tokens >= 0 else -tokens / self.rate
+        if delay > max_delay:
+            return None
+        self._buckets[user] = [tokens, now]
+        return delay
+
+    def _depth(self):
+        return sum(len(q) for q in self._queues.values())
+
+    def _position(self, ticket):
+        queue = self._queues.get(ticket.user)
+        if not queue or ticket not in queue:
+            return 0
+        rounds = list(queue).index(ticket)
+        users_ahead = list(self._turns).index(ticket.user)
+        return rounds * len(self._turns) + users_ahead + 1
+
+    def _dispatch(self):
+        while self._active < self.max_concurrent and self._turns:
+            user = self._turns.popleft()
+            queue = self._queues[user]
+            queue.popleft().granted = True
+            self._active += 1
+            if queue:
+                self._turns.append(user)
+            else:
+                del self._queues[user]
+        self._cond.notify_all()
+
+    def _withdraw(self, ticket):
+        queue = self._queues.get(ticket.user)
+        if queue and ticket in queue:
+            queue.remove(ticket)
+            if not queue:
+                del self._queues[ticket.user]
+                self._turns.remove(ticket.user)
+
+    def _release(self, ticket):
+        """Frees the ticket's slot if it was granted, otherwise leaves the queue."""
+        with self._cond:
+            if ticket.granted:
+                self._active -= 1
+                self._dispatch()
+            else:
+                self._withdraw(ticket)
+
+    @contextmanager
+    def admit(self, user: str, on_wait=None, rate_limited=True):
+        """
+        Hold a model-call slot for the duration of the block.
+
+        on_wait(position) is called whenever the queue position changes, and
+        with 0 once the slot is granted. rate_limited=False skips the user's
+        token bucket (for follow-up calls such as summaries). Yields the
+        ticket; ticket.shed tells the caller to fall back to the smaller model.
+        """
+        with self._cond:
+            delay = self._take_token(user, self.max_wait) if rate_limited else 0.0
+        if delay is None:
+            raise AdmissionError("Too many requests, please wait a moment before sending again.")
+        if delay:
+            time.sleep(delay)
+
+        ticket = _Ticket(user)
+        deadline = time.monotonic() + self.max_wait
+        with self._cond:
+            ticket.shed = self._depth() >= self.shed_depth
+            self._queues.setdefault(user, deque()).append(ticket)
+            if user not in self._turns:
+                self._turns.append(user)
+            self._dispatch()
+
+        try:
+            reported = None
+            while True:
+                with self._cond:
+                    if not ticket.granted:
+                        self._cond.wait(0.5)
+                    if ticket.granted:
+                        break
+                    if time.monotonic() > deadline:
+                        raise AdmissionError("The assistant is busy right now, please try again shortly.")
+                    position = self._position(ticket)
+                if on_wait and position != reported:
+                    on_wait(position)
+                    reported = position
+            if on_wait and reported:
+                on_wait(0)
+        except BaseException:
+            # Also covers on_wait raising (e.g. Streamlit's rerun), so an
+            # abandoned ticket never keeps a slot
+            self._release(ticket)
+            raise
+
+        try:
+            yield ticket
+        finally:
+            self._release(ticket)
+
+    def stats(self):
+        with self._cond:
+            return {"active": self._active, "queued": self._depth(), "users_waiting": len(self._turns)}
+
+
+admission = AdmissionController()
@@ -0,0 +1,91 @@
+# bm25_index.py
+import json
+import math
+import re
+from collections import Counter
+from pathlib import Path
+
+from langchain_core.documents import Document
+
+# Keeps identifiers such as intel_pstate, cpupower, 0x80070005 or acpi-cpufreq whole
+_TOKEN = re.compile(r"[a-z0-9][a-z0-9_.\-]*[a-z0-9]|[a-z0-9]")
+
+
+def tokenize(text: str):
+    return _TOKEN.findall(text.lower())
+
+
+class BM25Index:
+    """Okapi BM25 over the corpus chunks, kept as a plain inverted index."""
+
+    def __init__(self, ids, texts, metadatas, postings, lengths, k1=1.5, b=0.75):
+        self.ids = ids
+        self.texts = texts
+        self.metadatas = metadatas
+        self.postings = postings  # term -> [[doc index, term frequency], ...]
+        self.lengths = lengths
+        self.k1 = k1
+        self.b = b
+        self.avg_len = sum(lengths) / len(lengths) if lengths else 0.0
+
+    @classmethod
+    def build(cls, ids, texts, metadatas):
+        postings, lengths = {}, []
+        for i, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append([i, tf])
+        return cls(list(ids), list(texts), list(metadatas), postings, lengths)
+
+    def _allowed(self, fields):
+        return {
+            i for i, meta in enumerate(self.metadatas)
+            if all(meta.get(k) == v for k, v in fields.items())
+        }
+
+    def search(self, query: str, k: int, fields=None):
+        """Top-k (doc index, score), best first; fields restricts metadata by equality."""
+        n = len(self.ids)
+        allowed = self._allowed(fields) if fields else None
+        scores = {}
+        for term in set(tokenize(query)):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = math.log(1 + (n - len(plist) + 0.5) / (len(plist) + 0.5))
+            for i, tf in plist:
+                if allowed is not None and i not in allowed:
+                    continue
+                norm = tf + self.k1 * (1 - self.b + self.b * self.lengths[i] / self.avg_len)
+                scores[i] = scores.get(i, 0.0) + idf * tf * (self.k1 + 1) / norm
+        return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:k]
+
+    def documents(self, query: str, k: int, fields=None):
+        return [
+            Document(id=self.ids[i], page_content=self.texts[i], metadata=self.metadatas[i])
+            for i, _ in self.search(query, k, fields)
+        ]
+
+    def save(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "ids": self.ids,
+                    "texts": self.texts,
+                    "metadatas": self.metadatas,
+                    "postings": self.postings,
+                    "lengths": self.lengths,
+                },
+                f,
+                ensure_ascii=False,
+            )
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["ids"], data["texts"], data["metadatas"], data["postings"], data["lengths"])
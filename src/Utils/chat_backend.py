@@ -1,19 +1,97 @@
 import streamlit as st
 import json
+import threading
 from typing import List, Tuple, Optional, Dict, Any
 from datetime import datetime
 from supabase import create_client
 from supabase import Client
 from src.Utils.supabase_config import url, key
-from langchain_groq import ChatGroq
-from src.Utils.rag_app import answer_query
-from src.Utils.rag_config import SUMMARY_MODEL, GROQ_API_KEY
+from src.Utils.admission import AdmissionError, admission, current_user
+from src.Utils.chat_memory import forget_in_background, remember_in_background, sync_memory_in_background
+from src.Utils.rag_app import stream_answer_query
+from src.Utils.rag_config import SUMMARY_MODEL, get_chat_model
+from src.Utils.single_flight import normalize_key, summary_flight
+from src.Utils.system_report_index import sync_in_background
 
 def _get_supabase_client() -> Client:
     if not url or not key:
         raise RuntimeError("Supabase credentials missing in supabase_config.py")
     return create_client(url, key)
 
+# One row per turn, keyed by (email, chat_id, seq). Rows are only ever
+# appended; all_chats keeps the per-chat metadata (title, summary, tags).
+CHAT_MESSAGES_TABLE = "chat_messages"
+# Supabase returns at most this many rows per request by default
+CHAT_MESSAGES_PAGE = 1000
+
+def _empty_chat() -> dict:
+    return {"user_messages":[],"llm_responses":[],"title":"","summary":""}
+
+def _assemble_chats(meta_rows: List[dict], message_rows: List[dict]) -> Dict[int, dict]:
+    """Rebuild {chat_id: chat} from metadata rows and per-turn message rows."""
+    chats = {}
+    for row in meta_rows:
+        chat = _empty_chat()
+        chat["title"] = row.get("title") or ""
+        chat["summary"] = row.get("summary") or ""
+        # Chats written before the message table existed keep their arrays here
+        chat["user_messages"] = list(row.get("user_messages") or [])
+        chat["llm_responses"] = list(row.get("llm_responses") or [])
+        chats[row["chat_id"]] = chat
+    turns: Dict[int, List[dict]] = {}
+    for row in message_rows:
+        turns.setdefault(row["chat_id"], []).append(row)
+    for chat_id, rows in turns.items():
+        # No metadata row: the chat was deleted and is awaiting its purge
+        if chat_id not in chats:
+            continue
+        rows.sort(key=lambda r: r["seq"])
+        chat = chats[chat_id]
+        # Legacy turns (before the first stored seq) stay in front
+        first = rows[0]["seq"]
+        chat["user_messages"] = chat["user_messages"][:first] + [r["user_message"] for r in rows]
+        chat["llm_responses"] = chat["llm_responses"][:first] + [r["llm_response"] for r in rows]
+    return chats
+
+def _next_chat_id() -> int:
+    """A chat id never issued to this user before, even if that chat was deleted."""
+    issued = max(st.session_state.get("last_chat_id", 0), max(st.session_state.get("chat_id") or [0]))
+    st.session_state.last_chat_id = issued + 1
+    return issued + 1
+
+def _load_chat_meta(sb: Client, email: str, chat_ids: List[int]):
+    def select(columns):
+        return (
+            sb.table("all_chats")
+            .select(columns)
+            .eq("email",email)
+            .in_("chat_id",chat_ids)
+        )
+    columns = "chat_id,title,summary,metadata,user_messages,llm_responses"
+    try:
+        return select(columns + ",message_count").is_("deleted_at","null").execute()
+    except Exception as e:
+        # Not migrated yet (see sql/chat_schema.sql): nothing can be soft-deleted
+        print(f"Could not filter deleted chats: {e}")
+        return select(columns).execute()
+
+def _load_chat_messages(sb: Client, email: str) -> List[dict]:
+    """Every stored turn of the user, read page by page."""
+    rows = []
+    while True:
+        page = (
+            sb.table(CHAT_MESSAGES_TABLE)
+            .select("chat_id,seq,user_message,llm_response")
+            .eq("email",email)
+            .order("chat_id")
+            .order("seq")
+            .range(len(rows), len(rows) + CHAT_MESSAGES_PAGE - 1)
+            .execute()
+        ).data or []
+        rows.extend(page)
+        if len(page) < CHAT_MESSAGES_PAGE:
+            return rows
+
 def load_past_chats(email:str):
     st.session_state.setdefault("chat_id",{})
     st.session_state.chat_id = {}
@@ -27,27 +105,48 @@ def load_past_chats(email:str):
         chat_ids = [entry["chat_id"] for entry in resp.data]
     except Exception as e:
         chat_ids = []
-    for chat_id in chat_ids:
-        chat_resp = (sb.table("all_chats").select("*").eq("email",email).eq("chat_id",chat_id).execute())
-        data = chat_resp.data
-        # print(data)
-        # print(type(data[0]))
-        st.session_state.chat_id.update({
-            chat_id : {"user_messages":data[0]["user_messages"] , "llm_responses" : data[0]["llm_responses"], "title":data[0]["title"],"summary":data[0]["summary"]}
+    if chat_ids:
+        meta_resp = _load_chat_meta(sb, email, chat_ids)
+        try:
+            message_rows = _load_chat_messages(sb, email)
+        except Exception as e:
+            # Not migrated yet (see sql/chat_schema.sql): legacy arrays only
+            print(f"Could not read {CHAT_MESSAGES_TABLE}: {e}")
+            message_rows = []
+        chats = _assemble_chats(meta_resp.data or [], message_rows)
+        # What the database says is stored, not what happened to be read back
+        stored = {row["chat_id"]: row.get("message_count") for row in meta_resp.data or []}
+        persisted = st.session_state.setdefault("persisted_turns", {})
+        for chat_id in chat_ids:
+            if chat_id in chats:
+                st.session_state.chat_id[chat_id] = chats[chat_id]
+                persisted[chat_id] = stored.get(chat_id) or len(chats[chat_id]["user_messages"])
+        # Past-chat memory only needs the summaries; unchanged ones aren't re-embedded
+        sync_memory_in_background(email, {
+            row["chat_id"]: {
+                "title": row.get("title") or "",
+                "summary": row.get("summary") or "",
+                "tags": (row.get("metadata") or {}).get("tags"),
+            }
+            for row in meta_resp.data or []
         })
-    new_id = max(chat_ids)+1 if len(chat_ids) > 0 else 1
+    # Highest id ever issued, including deleted chats
+    st.session_state.last_chat_id = max(chat_ids) if chat_ids else 0
+    new_id = _next_chat_id()
     st.session_state.chat_id.update({
-        new_id : {"user_messages":[],"llm_responses":[],"title":"","summary":""}
+        new_id : _empty_chat()
     })
     st.session_state.setdefault("current_chat_id",new_id)
     # system report count
     st.session_state.setdefault("report_times",[])
     st.session_state.report_times = []
     report_timings = (
-        sb.table("user_system_reports").select("created_at").eq("user_email",email).execute()
+        sb.table("user_system_reports").select("id","created_at").eq("user_email",email).execute()
     )
     try:
         st.session_state.report_times = [entry["created_at"] for entry in report_timings.data]
+        # New reports are embedded once, off the page's critical path
+        sync_in_background(sb, email, [entry["id"] for entry in report_timings.data])
     except Exception as e:
         st.session_state.report_times = []
 
@@ -68,45 +167,134 @@ def update_chat() -> dict:
             return {"error" : "unable to get summary and metadata"}
         st.session_state.chat_id[st.session_state.current_chat_id]["title"] = title
         st.session_state.chat_id[st.session_state.current_chat_id]["summary"] = summary
-        payload = {
-            "chat_id" : chat_id,
-            "email" : email,
-            "title" : title,
-            "user_messages" : messages,
-            "llm_responses" : responses,
-            "summary" : summary,
-            "metadata" : metadata
-        }
-        resp1 = ( sb.table("all_chats").upsert(payload).execute() )
-        resp2 = ( sb.table("user_chat_nums").upsert({"email":email,"chat_id":chat_id}).execute() )
-        if "error" in resp1:
-            return {"error" : resp1.error}
-        if "error" in resp2:
-            return {"error" : resp2.error}
+        count = len(messages)
+        # Turns up to here are known to be stored; a failed write leaves the
+        # marker where it was, so the next turn writes the missed ones too
+        persisted = st.session_state.setdefault("persisted_turns", {})
+        first = min(persisted.get(chat_id, 0), count - 1)
+        new_chat = persisted.get(chat_id, 0) == 0
+        if new_chat:
+            # Record the id before any row uses it: a chat whose later writes
+            # fail must still count as issued, or the next login reissues it
+            sb.table("user_chat_nums").upsert(
+                {"email":email,"chat_id":chat_id}, on_conflict="email,chat_id", ignore_duplicates=True
+            ).execute()
+        # Retries hit the (email, chat_id, seq) key and are ignored instead
+        # of duplicating a turn
+        sb.table(CHAT_MESSAGES_TABLE).upsert(
+            [
+                {
+                    "email" : email,
+                    "chat_id" : chat_id,
+                    "seq" : seq,
+                    "user_message" : messages[seq],
+                    "llm_response" : responses[seq],
+                }
+                for seq in range(first, count)
+            ],
+            on_conflict="email,chat_id,seq",
+            ignore_duplicates=True,
+        ).execute()
+        meta = {"title" : title, "summary" : summary, "metadata" : metadata, "message_count" : count}
+        if new_chat:
+            # Not known to be stored yet (new chat, or its first write failed):
+            # create the row. This also clears any stale soft-delete marker.
+            sb.table("all_chats").upsert(
+                {"chat_id" : chat_id, "email" : email, **meta, "deleted_at" : None},
+                on_conflict="email,chat_id",
+            ).execute()
+        else:
+            # One conditional write, skipped if a newer turn already wrote the metadata
+            (
+                sb.table("all_chats")
+                .update(meta)
+                .eq("email",email)
+                .eq("chat_id",chat_id)
+                .or_(f"message_count.is.null,message_count.lt.{count}")
+                .execute()
+            )
+        persisted[chat_id] = max(persisted.get(chat_id, 0), count)
+        # Only once the chat is stored, so memory never recalls a chat the
+        # database does not have
+        remember_in_background(email, chat_id, title, summary, metadata.get("tags"))
         st.session_state.history_dirty = True
         return {"message" :  "Success!"}
     except Exception as e:
         return {"error" : e}
 
-def manage_deletes():
+# Tables purged for a deleted chat, child rows first. user_chat_nums keeps
+# every id ever issued so ids are never reused (a reused id would pick up
+# whatever rows a failed purge left behind).
+_CHAT_TABLES = (CHAT_MESSAGES_TABLE, "all_chats")
+
+def _purge_chats(sb: Client, email: str, chat_ids: List[int]) -> Dict[str, str]:
+    """Hard-delete chat_ids from every chat table, one request per table."""
+    failed = {}
+    for table in _CHAT_TABLES:
+        try:
+            sb.table(table).delete().eq("email",email).in_("chat_id",chat_ids).execute()
+        except Exception as e:
+            failed[table] = str(e)
+    return failed
+
+def _purge_in_background(email: str, chat_ids: List[int]):
+    def _run():
+        try:
+            failed = _purge_chats(_get_supabase_client(), email, chat_ids)
+        except Exception as e:
+            failed = {"client": str(e)}
+        if failed:
+            print(f"Purge of chats {chat_ids} incomplete: {failed}")
+    threading.Thread(target=_run, name="chat-purge", daemon=True).start()
+
+def manage_deletes(soft: bool = True) -> dict:
+    """
+    Delete the chats in st.session_state.selected_chat_ids.
+
+    With soft=True the chats are hidden with a single update on all_chats and
+    the rows are purged on a background thread, so the page returns at once.
+    Otherwise the chat tables are purged before returning. Returns
+    {"deleted": [...], "failed": {table: error}}.
+    """
     # Alvin's Part here.
+    chat_ids = list(st.session_state.get("selected_chat_ids", []))
+    if not chat_ids:
+        return {"deleted": [], "failed": {}}
     try:
         sb = _get_supabase_client()
         email = st.user.get("email","")
-        cid = st.session_state.current_chat_id
-        flag = False
-        if cid in st.session_state.selected_chat_ids:
-            flag = True
-        for sid in st.session_state.selected_chat_ids:
-            st.session_state.chat_id.pop(sid,None)
-            d1 = ( sb.table("all_chats").delete().eq("chat_id",sid).eq("email",email).execute() )
-            d2 = ( sb.table("user_chat_nums").delete().eq("chat_id",sid).eq("email",email).execute() )
-        if flag:
-            on_btn_click()
-        st.session_state.history_dirty = True
-        
+        if soft:
+            (
+                sb.table("all_chats")
+                .update({"deleted_at": datetime.utcnow().isoformat()})
+                .eq("email",email)
+                .in_("chat_id",chat_ids)
+                .execute()
+            )
+            failed = {}
+            _purge_in_background(email, chat_ids)
+        else:
+            failed = _purge_chats(sb, email, chat_ids)
     except Exception as e:
-        pass
+        return {"deleted": [], "failed": {"all_chats": str(e)}}
+
+    # Any table left behind means the chat isn't really gone
+    if failed:
+        return {"deleted": [], "failed": failed}
+
+    forget_in_background(email, chat_ids)
+    flag = st.session_state.current_chat_id in chat_ids
+    for sid in chat_ids:
+        st.session_state.chat_id.pop(sid,None)
+    if flag:
+        on_btn_click()
+    st.session_state.history_dirty = True
+    return {"deleted": chat_ids, "failed": failed}
+
+def _admitted_invoke(llm, prompt, user):
+    # Summaries follow every answer, so they only count against concurrency
+    with admission.admit(user, rate_limited=False):
+        return llm.invoke(prompt)
 
 def summarize_and_meta(
     messages: List[str], 
@@ -137,12 +325,8 @@ def summarize_and_meta(
     )
 
     try:
-        # Initialize Groq Chat Model
-        llm = ChatGroq(
-            model=target_model,
-            api_key=GROQ_API_KEY,
-            temperature=0.0  # Keep 0 for consistent JSON
-        )
+        # Shared Groq Chat Model
+        llm = get_chat_model(target_model, 0.0)  # Keep 0 for consistent JSON
 
         # Updated Prompt: Optimized for Llama 3 to enforce JSON
         prompt = (
@@ -156,8 +340,8 @@ def summarize_and_meta(
             "Output JSON:"
         )
 
-        # Invoke model
-        resp = llm.invoke(prompt)
+        # Invoke model; identical in-flight summaries share one call
+        resp = summary_flight.do(normalize_key(target_model, prompt), _admitted_invoke, llm, prompt, current_user())
         content = getattr(resp, "content", str(resp))
 
         # --- Cleaning Llama 3 Output ---
@@ -186,19 +370,40 @@ def summarize_and_meta(
 
 
 def on_input_change():
-    """Handles updating the chat to supabase when new messages are sent"""
+    """Queues the new message; the chat page streams the answer on rerun"""
     user_input = st.session_state.user_input.strip()
     if not user_input:
         # print("No message")
         return
+    st.session_state.pending_query = user_input
+    # Clear the input box after sending
+    st.session_state.user_input = ""
 
-    # store user message
-    # print(user_input)
+def stream_pending_answer(on_queue=None):
+    """
+    Yields the answer to st.session_state.pending_query as it is generated,
+    then stores the finished turn and saves the chat to supabase.
+    on_queue(position) reports the place in the model queue while waiting.
+    """
+    user_input = st.session_state.pop("pending_query", None)
+    if not user_input:
+        return
+    parts = []
     # RAG call
     try:
-        answer = answer_query(user_input)
+        for chunk in stream_answer_query(user_input, on_queue=on_queue):
+            parts.append(chunk)
+            yield chunk
+    except AdmissionError as e:
+        # Not a turn: storing it would run the summary call the limit just
+        # refused. The page shows the notice after its rerun.
+        st.session_state.admission_notice = str(e)
+        return
     except Exception as e:
-        answer = f"RAG error: {e}"
+        error = f"RAG error: {e}"
+        parts = [error] if not parts else parts + ["\n\n" + error]
+        yield parts[-1]
+    answer = "".join(parts)
     st.session_state.chat_id[st.session_state.current_chat_id]["user_messages"].append(user_input)
     st.session_state.chat_id[st.session_state.current_chat_id]["llm_responses"].append(answer)
     response = update_chat()
@@ -209,8 +414,6 @@ def on_input_change():
     else:
         pass
         # print(f"Success !")
-    # Clear the input box after sending
-    st.session_state.user_input = ""
 
 def on_btn_click():
     """Handles clearing the chat to get an empty chat"""
@@ -231,7 +434,7 @@ def on_btn_click():
     if len(st.session_state.chat_id) and len(st.session_state.chat_id[last_id]["user_messages"]) == 0:
         st.session_state.current_chat_id = last_id
     else:
-        st.session_state.current_chat_id = last_id + 1
+        st.session_state.current_chat_id = _next_chat_id()
         st.session_state.chat_id.update({
             st.session_state.current_chat_id : {"user_messages":[],"llm_responses":[],"title":"","summary":""}
         })
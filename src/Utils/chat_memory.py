@@ -0,0 +1,103 @@
+# chat_memory.py
+import logging
+import threading
+
+from src.Utils.prompt_builder import MIN_PART_TOKENS, count_tokens, truncate_tokens
+from src.Utils.rag_config import (
+    CHAT_MEMORY_DIR,
+    CHAT_MEMORY_MIN_SCORE,
+    CHAT_MEMORY_TOKEN_BUDGET,
+    CHAT_MEMORY_TOP_K,
+)
+from src.Utils.user_docs import UserDocStore
+
+logger = logging.getLogger(__name__)
+
+# One entry per chat: its title, tags and running summary, never the messages
+chat_memory = UserDocStore(CHAT_MEMORY_DIR, source="chat_memory")
+
+
+def _name(chat_id) -> str:
+    return f"chat-{chat_id}"
+
+
+def _entry(title: str, summary: str, tags) -> str:
+    tags = ", ".join(str(t) for t in tags or [])
+    return f"{title}\nTags: {tags}\n{summary}" if tags else f"{title}\n{summary}"
+
+
+def remember_chat(user: str, chat_id, title: str, summary: str, tags=None):
+    """Re-embeds the chat's entry only if its title, summary or tags changed."""
+    if not user or not summary:
+        return
+    text = _entry(title or "", summary, tags)
+    if chat_memory.has(user, _name(chat_id), [text]):
+        return
+    chat_memory.add_chunks(user, _name(chat_id), [text], [{"chat_id": chat_id, "topic": title or ""}])
+
+
+def forget_chats(user: str, chat_ids):
+    for chat_id in chat_ids:
+        chat_memory.remove(user, _name(chat_id))
+
+
+def sync_chats(user: str, chats: dict):
+    """Brings the memory in line with the chats loaded at login."""
+    wanted = {_name(chat_id) for chat_id, chat in chats.items() if chat.get("summary")}
+    for name in set(chat_memory.documents(user)) - wanted:
+        chat_memory.remove(user, name)
+    for chat_id, chat in chats.items():
+        if chat.get("summary"):
+            remember_chat(user, chat_id, chat.get("title"), chat["summary"], chat.get("tags"))
+
+
+def _in_background(name: str, target, *args):
+    def _run():
+        try:
+            target(*args)
+        except Exception as e:
+            logger.warning("Chat memory %s failed: %s", name, e)
+    threading.Thread(target=_run, name=f"chat-memory-{name}", daemon=True).start()
+
+
+def remember_in_background(user: str, chat_id, title: str, summary: str, tags=None):
+    _in_background("update", remember_chat, user, chat_id, title, summary, tags)
+
+
+def forget_in_background(user: str, chat_ids):
+    _in_background("delete", forget_chats, user, list(chat_ids))
+
+
+def sync_memory_in_background(user: str, chats: dict):
+    _in_background("sync", sync_chats, user, dict(chats))
+
+
+def recall_chats(user: str, query: str, exclude_chat_id=None, budget: int = CHAT_MEMORY_TOKEN_BUDGET) -> str:
+    """
+    Summaries of the user's past chats most related to the query, best
+    first, fitted into budget tokens. The current chat is left out.
+    """
+    if not user or user == "anonymous" or budget <= 0:
+        return ""
+    try:
+        docs = chat_memory.search(user, query, CHAT_MEMORY_TOP_K + 1, min_score=CHAT_MEMORY_MIN_SCORE)
+    except Exception as e:
+        logger.warning("Chat memory lookup failed for %s: %s", user, e)
+        return ""
+    parts, remaining = [], budget
+    for doc in docs:
+        if doc.metadata.get("chat_id") == exclude_chat_id:
+            continue
+        if len(parts) == CHAT_MEMORY_TOP_K:
+            break
+        text = f"- {doc.page_content}"
+        n = count_tokens(text)
+        if n > remaining:
+            if remaining < MIN_PART_TOKENS:
+                break
+            # Leave room for the " ..." marker so the budget is never exceeded
+            text = truncate_tokens(text, remaining - 4)
+            n = count_tokens(text)
+        parts.append(text)
+        remaining -= n
+    return "\n".join(parts)
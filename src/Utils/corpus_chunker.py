@@ -0,0 +1,97 @@
+# corpus_chunker.py
+from langchain_core.documents import Document
+
+# Section order inside a chunk; problem description first, then fixes
+SECTION_ORDER = [
+    "description", "concept", "concepts", "symptoms", "causes", "diagnosis",
+    "solutions", "commands", "tools", "usage", "notes",
+]
+# Top-level keys that aren't content (the older topic/description schema
+# keeps its sections at the top level)
+_META_KEYS = {"id", "title", "topic", "source", "os", "distro", "category", "confidence", "tags", "references", "content"}
+
+
+def _render_item(item) -> str:
+    if isinstance(item, dict):
+        head = item.get("step") or item.get("fix") or item.get("name") or ""
+        command = item.get("command")
+        notes = item.get("notes")
+        rest = [f"{k}: {v}" for k, v in item.items() if k not in ("step", "fix", "name", "command", "notes")]
+        text = head
+        if command:
+            text += f": `{command}`" if text else f"`{command}`"
+        if notes:
+            text += f" ({notes})"
+        if rest:
+            text += "; " + "; ".join(rest)
+        return text
+    return str(item)
+
+
+def _render_section(name: str, value) -> str:
+    label = name.replace("_", " ").capitalize()
+    if isinstance(value, list):
+        return f"{label}:\n" + "\n".join(f"- {_render_item(v)}" for v in value)
+    if isinstance(value, dict):
+        return f"{label}:\n" + "\n".join(f"- {k}: {_render_item(v)}" for k, v in value.items())
+    return f"{label}: {value}"
+
+
+def _sections(content: dict):
+    body = content.get("content")
+    if not isinstance(body, dict):
+        body = {k: v for k, v in content.items() if k not in _META_KEYS}
+    ordered = [k for k in SECTION_ORDER if k in body]
+    ordered += [k for k in body if k not in SECTION_ORDER]
+    return [(k, _render_section(k, body[k])) for k in ordered if body[k]]
+
+
+def chunk_json(content, metadata: dict, max_chars: int):
+    """
+    Compact, self-contained chunks for one system_knowledge document.
+
+    Sections are rendered as plain text and packed whole into chunks of up to
+    max_chars, each starting with the title and tags, so a symptoms list stays
+    with its causes/diagnosis unless the document is too big for one chunk.
+    Returns None if content doesn't follow the schema.
+    """
+    if not isinstance(content, dict):
+        return None
+    sections = _sections(content)
+    if not sections:
+        return None
+
+    title = content.get("title") or content.get("topic") or metadata.get("topic", "")
+    tags = content.get("tags") or [t for t in [content.get("category")] if t]
+    if isinstance(tags, str):
+        tags = [tags]
+    header = f"{title}\nTags: {', '.join(tags)}" if tags else title
+    source = content.get("source")
+    url = source.get("url", "") if isinstance(source, dict) else ""
+
+    groups, current, size = [], [], len(header)
+    for name, text in sections:
+        if current and size + len(text) + 2 > max_chars:
+            groups.append(current)
+            current, size = [], len(header)
+        current.append((name, text))
+        size += len(text) + 2
+    if current:
+        groups.append(current)
+
+    chunks = []
+    for i, group in enumerate(groups):
+        chunks.append(
+            Document(
+                page_content="\n\n".join([header] + [text for _, text in group]),
+                metadata={
+                    **metadata,
+                    "title": title,
+                    "tags": ",".join(tags),
+                    "sections": ",".join(name for name, _ in group),
+                    "url": url,
+                    "chunk_index": i,
+                },
+            )
+        )
+    return chunks
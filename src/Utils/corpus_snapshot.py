@@ -0,0 +1,133 @@
+# corpus_snapshot.py
+import hashlib
+import json
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+from src.Utils.vector_index import NumpyVectorIndex
+
+# <root>/<version>/{embeddings.npy, texts.bin, offsets.npy, metadata.json}
+# plus <root>/CURRENT naming the version readers should open
+_POINTER = "CURRENT"
+_KEEP = 2  # older snapshot a worker may still have mapped
+
+
+class TextBlob:
+    """Chunk texts as one memory-mapped UTF-8 blob, decoded on access."""
+
+    def __init__(self, blob, offsets):
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        start, end = self._offsets[i], self._offsets[i + 1]
+        return bytes(self._blob[start:end]).decode("utf-8")
+
+
+def _version(ids, settings) -> str:
+    digest = hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8"))
+    for chunk_id in sorted(ids):
+        digest.update(chunk_id.encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def write_snapshot(root: Path, ids, vectors, texts, metadatas, settings: dict) -> str:
+    """
+    Writes an immutable snapshot of the collection and points CURRENT at it.
+
+    The version is derived from the chunk ids and settings, so re-running an
+    unchanged ingest reuses the existing snapshot.
+    """
+    version = _version(ids, settings)
+    target = root / version
+    if not target.exists():
+        tmp = root / f".{version}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+
+        if len(ids):
+            matrix = np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1)
+        else:
+            # An empty collection's embeddings come back as [] or None
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.save(tmp / "embeddings.npy", matrix / np.where(norms == 0, 1.0, norms))
+
+        encoded = [text.encode("utf-8") for text in texts]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        (tmp / "texts.bin").write_bytes(b"".join(encoded))
+        np.save(tmp / "offsets.npy", offsets)
+
+        (tmp / "metadata.json").write_text(
+            json.dumps({"version": version, "settings": settings, "ids": list(ids), "metadatas": list(metadatas)}),
+            encoding="utf-8",
+        )
+        tmp.rename(target)
+
+    pointer = root / f"{_POINTER}.tmp"
+    pointer.write_text(version, encoding="utf-8")
+    pointer.replace(root / _POINTER)
+    _prune(root, version)
+    return version
+
+
+def _prune(root: Path, current: str):
+    snapshots = sorted(
+        (p for p in root.iterdir() if p.is_dir() and not p.name.startswith(".")),
+        key=lambda p: p.stat().st_mtime_ns,
+        reverse=True,
+    )
+    for path in [p for p in snapshots if p.name != current][_KEEP - 1:]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def current_snapshot(root: Path):
+    """Directory of the snapshot CURRENT points at, or None if there is none."""
+    try:
+        version = (root / _POINTER).read_text(encoding="utf-8").strip()
+    except OSError:
+        return None
+    path = root / version
+    return path if version and path.is_dir() else None
+
+
+class SnapshotPointer:
+    """
+    current_snapshot(root), re-read only when ingestion replaces CURRENT:
+    each call is one stat of the pointer file rather than a read of it.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self._state = (None, None)  # (pointer mtime, snapshot dir)
+
+    def get(self):
+        try:
+            mtime = (self.root / _POINTER).stat().st_mtime_ns
+        except OSError:
+            return None
+        seen, path = self._state
+        if mtime != seen:
+            path = current_snapshot(self.root)
+            self._state = (mtime, path)
+        return path
+
+
+def open_snapshot(path: Path) -> NumpyVectorIndex:
+    """
+    Maps a snapshot read-only: every process opening it shares the same
+    page-cache pages for the matrix and texts instead of loading a copy.
+    """
+    matrix = np.load(path / "embeddings.npy", mmap_mode="r")
+    offsets = np.load(path / "offsets.npy", mmap_mode="r")
+    blob = np.memmap(path / "texts.bin", dtype=np.uint8, mode="r") if offsets[-1] else b""
+    meta = json.loads((path / "metadata.json").read_text(encoding="utf-8"))
+    return NumpyVectorIndex(
+        meta["ids"], matrix, TextBlob(blob, offsets), meta["metadatas"], normalized=True
+    )
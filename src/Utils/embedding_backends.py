@@ -0,0 +1,94 @@
+# embedding_backends.py
+# No rag_config/streamlit imports: ingestion worker processes load models
+# through this module.
+import threading
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+def _hub_name(model_name: str) -> str:
+    return model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Sentence-transformers model exported to ONNX (int8 by default), run on
+    onnxruntime with mean pooling and L2 normalization, like the original
+    all-MiniLM-L6-v2 pipeline. Does not import torch.
+    """
+
+    def __init__(self, model_name: str, onnx_file: str, threads: int = 1, batch_size: int = 64, max_length: int = 256):
+        import onnxruntime as ort
+        from huggingface_hub import hf_hub_download
+        from tokenizers import Tokenizer
+
+        repo = _hub_name(model_name)
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = threads
+        opts.inter_op_num_threads = 1
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self._session = ort.InferenceSession(
+            hf_hub_download(repo, onnx_file), opts, providers=["CPUExecutionProvider"]
+        )
+        self._inputs = {i.name for i in self._session.get_inputs()}
+        self._tokenizer = Tokenizer.from_pretrained(repo)
+        self._tokenizer.enable_truncation(max_length=max_length)
+        self._tokenizer.enable_padding()
+        self._lock = threading.Lock()  # the tokenizer's padding state isn't thread-safe
+        self.batch_size = batch_size
+
+    def _embed(self, texts):
+        with self._lock:
+            encodings = self._tokenizer.encode_batch(list(texts))
+        ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": ids, "attention_mask": mask, "token_type_ids": np.zeros_like(ids)}
+        hidden = self._session.run(None, {k: v for k, v in feeds.items() if k in self._inputs})[0]
+        weights = mask[..., None].astype(np.float32)
+        pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts):
+        out = []
+        for i in range(0, len(texts), self.batch_size):
+            out.extend(self._embed(texts[i:i + self.batch_size]).tolist())
+        return out
+
+    def embed_query(self, text: str):
+        return self._embed([text])[0].tolist()
+
+
+def load_embeddings(backend: str, model_name: str, onnx_file: str = "", threads: int = 1) -> Embeddings:
+    """Embedding model for EMBED_BACKEND: "onnx" or "torch" (sentence-transformers)."""
+    if backend == "onnx":
+        return OnnxEmbeddings(model_name, onnx_file, threads=threads)
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    return HuggingFaceEmbeddings(model_name=model_name)
+
+
+PARITY_TEXTS = [
+    "why is my cpu throttling",
+    "how to check battery health on ubuntu",
+    "journalctl -b -1 shows a failed unit",
+    "Windows Event Viewer disk error 0x80070005",
+]
+
+
+def check_parity(model_name: str, onnx_file: str, texts=PARITY_TEXTS, min_cosine: float = 0.98):
+    """Cosine similarity between ONNX and PyTorch vectors for the same texts."""
+    onnx_vecs = np.asarray(load_embeddings("onnx", model_name, onnx_file).embed_documents(texts))
+    torch_vecs = np.asarray(load_embeddings("torch", model_name).embed_documents(texts))
+    torch_vecs = torch_vecs / np.linalg.norm(torch_vecs, axis=1, keepdims=True)
+    cosines = (onnx_vecs * torch_vecs).sum(axis=1)
+    return {"min_cosine": float(cosines.min()), "mean_cosine": float(cosines.mean()), "ok": bool(cosines.min() >= min_cosine)}
+
+
+if __name__ == "__main__":
+    import os
+
+    print(check_parity(
+        os.getenv("EMBED_MODEL_NAME", "all-MiniLM-L6-v2"),
+        os.getenv("EMBED_ONNX_FILE", "onnx/model_quint8_avx2.onnx"),
+    ))
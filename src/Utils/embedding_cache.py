@@ -0,0 +1,100 @@
+# embedding_cache.py
+import atexit
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    LRU cache of query embeddings in front of another Embeddings.
+
+    Keys are (model name, normalized query); vectors are kept as float32.
+    Document embedding (ingestion) is passed straight through. If path is
+    set, the cache is loaded from and saved to an .npz file.
+    """
+
+    def __init__(self, base: Embeddings, model_name: str, maxsize: int = 4096, path=None):
+        self.base = base
+        self.model_name = model_name
+        self.maxsize = maxsize
+        self.path = Path(path) if path else None
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self.hits = 0
+        self.misses = 0
+        if self.path:
+            self._load()
+            atexit.register(self.save)
+
+    def vector(self, text: str) -> np.ndarray:
+        """Query embedding as a float32 array, computed at most once per query."""
+        key = (self.model_name, _normalize(text))
+        with self._lock:
+            vec = self._cache.get(key)
+            if vec is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return vec
+            self.misses += 1
+        vec = np.asarray(self.base.embed_query(text), dtype=np.float32)
+        vec.setflags(write=False)
+        with self._lock:
+            self._cache[key] = vec
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+            self._unsaved += 1
+            flush = self.path is not None and self._unsaved >= 64
+        if flush:
+            self.save()
+        return vec
+
+    def embed_query(self, text: str):
+        return self.vector(text).tolist()
+
+    def embed_documents(self, texts):
+        return self.base.embed_documents(texts)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._cache),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def _load(self):
+        try:
+            data = np.load(self.path, allow_pickle=False)
+        except (OSError, ValueError):
+            return
+        if str(data["model"]) != self.model_name:
+            return
+        for text, vec in zip(data["texts"], data["vectors"]):
+            vec = vec.astype(np.float32)
+            vec.setflags(write=False)
+            self._cache[(self.model_name, str(text))] = vec
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            if not self._cache:
+                return
+            texts = np.array([k[1] for k in self._cache])
+            vectors = np.stack(list(self._cache.values()))
+            self._unsaved = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp.npz")
+        np.savez(tmp, model=np.array(self.model_name), texts=texts, vectors=vectors)
+        tmp.replace(self.path)
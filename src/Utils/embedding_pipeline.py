@@ -0,0 +1,95 @@
+# embedding_pipeline.py
+# Kept free of rag_config/streamlit imports: worker processes import this
+# module and should only load the embedding model.
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from src.Utils.embedding_backends import load_embeddings
+
+_worker_model = None
+
+
+def _init_worker(backend: str, model_name: str, onnx_file: str, threads: int):
+    global _worker_model
+    if backend != "onnx":
+        import torch
+
+        torch.set_num_threads(threads)
+    _worker_model = load_embeddings(backend, model_name, onnx_file, threads)
+
+
+def _embed_batch(texts):
+    return _worker_model.embed_documents(texts)
+
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class _Progress:
+    def __init__(self, total=None):
+        self.total = total
+        self.done = 0
+        self.started = time.perf_counter()
+
+    def update(self, n):
+        self.done += n
+        rate = self.done / max(time.perf_counter() - self.started, 1e-9)
+        of_total = f"/{self.total}" if self.total else ""
+        print(f"   embedded {self.done}{of_total} chunks ({rate:.1f} chunks/s)")
+
+    def finish(self):
+        elapsed = time.perf_counter() - self.started
+        rate = self.done / elapsed if elapsed else 0.0
+        print(f"⚡ Embedded {self.done} chunks in {elapsed:.1f}s ({rate:.1f} chunks/s)")
+
+
+def embed_and_write(items, write, model_name, embeddings=None, batch_size=256, workers=1, total=None,
+                    backend="torch", onnx_file=""):
+    """
+    Embed (id, Document) pairs in batches and hand each batch to
+    write(ids, vectors, texts, metadatas).
+
+    With workers > 1 batches are sharded over a process pool, each worker
+    loading its own copy of the model. At most 2 batches per worker are in
+    flight, so memory stays bounded however many items come in. With one
+    worker, `embeddings` is used in-process.
+    """
+    progress = _Progress(total)
+
+    def _write(batch, vectors):
+        ids = [chunk_id for chunk_id, _ in batch]
+        texts = [doc.page_content for _, doc in batch]
+        metadatas = [doc.metadata for _, doc in batch]
+        write(ids, vectors, texts, metadatas)
+        progress.update(len(batch))
+
+    if workers <= 1:
+        for batch in _batches(items, batch_size):
+            _write(batch, embeddings.embed_documents([doc.page_content for _, doc in batch]))
+        progress.finish()
+        return progress.done
+
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    initargs = (backend, model_name, onnx_file, threads)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+        pending = {}
+        for batch in _batches(items, batch_size):
+            if len(pending) >= 2 * workers:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    _write(pending.pop(future), future.result())
+            future = pool.submit(_embed_batch, [doc.page_content for _, doc in batch])
+            pending[future] = batch
+        for future in list(pending):
+            _write(pending.pop(future), future.result())
+    progress.finish()
+    return progress.done
@@ -1,15 +1,21 @@
 # head_query.py
+from concurrent.futures import ThreadPoolExecutor
+
 from src.Utils.main_corpus_retrieval import retrieve_main_corpus
+from src.Utils.system_report_index import retrieve_system_data
+from src.Utils.user_docs import retrieve_user_docs
+
+_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="gather")
 
-def gather_context(query: str):
-    main_docs = retrieve_main_corpus(query)
 
-    # Later:
-    # user_docs = retrieve_user_docs(user_id)
-    # system_docs = retrieve_system_data(user_id)
+def gather_context(query: str, chat_context: str = "", user_id: str = ""):
+    # The user's partitions are searched while the main corpus is
+    user = _pool.submit(retrieve_user_docs, user_id, query)
+    system = _pool.submit(retrieve_system_data, user_id, query)
+    main_docs = retrieve_main_corpus(query, chat_context)
 
     return {
         "main": main_docs,
-        # "user": user_docs,
-        # "system": system_docs,
+        "user": user.result(),
+        "system": system.result(),
     }
@@ -0,0 +1,92 @@
+# lazy_init.py
+import logging
+import threading
+import time
+
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+_resources = []
+
+
+class LazyResource:
+    """
+    Thread-safe singleton created on first get().
+
+    load() does the imports and returns whatever build() needs; the two are
+    timed separately so import cost and initialization cost can be told apart.
+    """
+
+    def __init__(self, name: str, load, build):
+        self.name = name
+        self._load = load
+        self._build = build
+        self._value = None
+        self._lock = threading.Lock()
+        self.import_s = None
+        self.init_s = None
+        _resources.append(self)
+
+    @property
+    def ready(self) -> bool:
+        return self._value is not None
+
+    def get(self):
+        if self._value is None:
+            with self._lock:
+                if self._value is None:
+                    started = time.perf_counter()
+                    loaded = self._load()
+                    imported = time.perf_counter()
+                    value = self._build(loaded)
+                    self.import_s = imported - started
+                    self.init_s = time.perf_counter() - imported
+                    self._value = value
+                    logger.info("%s ready: import %.2fs, init %.2fs", self.name, self.import_s, self.init_s)
+        return self._value
+
+
+class LazyEmbeddings(Embeddings):
+    """Embeddings proxy that loads the real model on first use."""
+
+    def __init__(self, resource: LazyResource):
+        self.resource = resource
+
+    def embed_query(self, text: str):
+        return self.resource.get().embed_query(text)
+
+    def embed_documents(self, texts):
+        return self.resource.get().embed_documents(texts)
+
+
+def resource_timings() -> dict:
+    return {
+        r.name: {"ready": r.ready, "import_s": r.import_s, "init_s": r.init_s}
+        for r in _resources
+    }
+
+
+_warmup_started = False
+_warmup_lock = threading.Lock()
+
+
+def start_warmup(*steps):
+    """Runs each step once per process on a background thread, logging how long each took."""
+    global _warmup_started
+    with _warmup_lock:
+        if _warmup_started:
+            return
+        _warmup_started = True
+
+    def _run():
+        for step in steps:
+            started = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                logger.warning("warmup step %s failed: %s", step.__name__, e)
+                continue
+            logger.info("warmup %s took %.2fs", step.__name__, time.perf_counter() - started)
+
+    threading.Thread(target=_run, name="warmup", daemon=True).start()
@@ -1,4 +1,5 @@
 # main_corpus_ingestion.py
+import hashlib
 import json
 from pathlib import Path
 
@@ -6,145 +7,185 @@ from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_chroma import Chroma
 
+from src.Utils.bm25_index import BM25Index
+from src.Utils.corpus_chunker import chunk_json
+from src.Utils.corpus_snapshot import write_snapshot
+from src.Utils.embedding_pipeline import embed_and_write
 from src.Utils.rag_config import (
-    ARCH_WIKI_DIR,
+    BM25_INDEX_PATH,
     CHROMA_DIR,
-    UBUNTU_WIKI_DIR,
-    WINDOWS_DOCS_DIR,
+    CORPUS_SOURCES,
+    EMBED_BACKEND,
+    EMBED_BATCH_SIZE,
+    EMBED_MODEL_NAME,
+    EMBED_ONNX_FILE,
+    EMBED_WORKERS,
+    SNAPSHOT_DIR,
     embeddings,
     CHUNK_SIZE,
     CHUNK_OVERLAP,
 )
 
 
-def load_windows_docs():
-    documents = []
-    for domain_dir in WINDOWS_DOCS_DIR.iterdir():
-        if not domain_dir.is_dir():
-            continue
-
-        domain = domain_dir.name
-
-        for file in domain_dir.glob("*.json"):
-            topic = file.stem
-
-            with open(file, "r", encoding="utf-8") as f:
-                content = json.load(f)
-
-            text = json.dumps(content, indent=2, ensure_ascii=False)
-
-            documents.append(
-                Document(
-                    page_content=text,
-                    metadata={
-                        "source": "windows_docs",
-                        "domain": domain,
-                        "topic": topic,
-                        "os": "windows",
-                        "distro": "10/11",
-                        "path": str(file),
-                    },
-                )
-            )
-
-    return documents
-
-def load_arch_wiki_docs():
-    documents = []
-
-    for domain_dir in ARCH_WIKI_DIR.iterdir():
-        if not domain_dir.is_dir():
-            continue
-
-        domain = domain_dir.name
-
-        for file in domain_dir.glob("*.json"):
-            topic = file.stem
-
-            with open(file, "r", encoding="utf-8") as f:
-                content = json.load(f)
+def iter_source_files(sources=CORPUS_SOURCES):
+    """Yields (path, source entry, domain) for every JSON file in the registry."""
+    for entry in sources:
+        for domain_dir in sorted(entry["dir"].iterdir()):
+            if not domain_dir.is_dir():
+                continue
+            for file in sorted(domain_dir.glob("*.json")):
+                yield file, entry, domain_dir.name
+
+
+def make_document(file: Path, entry: dict, domain: str, raw: bytes) -> Document:
+    content = json.loads(raw.decode("utf-8"))
+    text = json.dumps(content, ensure_ascii=False, separators=(",", ":"))
+    return Document(
+        page_content=text,
+        metadata={
+            "source": entry["source"],
+            "domain": domain,
+            "topic": file.stem,
+            "os": entry["os"],
+            "distro": entry["distro"],
+            "path": str(file),
+        },
+    )
 
-            text = json.dumps(content, indent=2, ensure_ascii=False)
 
-            documents.append(
-                Document(
-                    page_content=text,
-                    metadata={
-                        "source": "arch_wiki",
-                        "domain": domain,
-                        "topic": topic,
-                        "os": "linux",
-                        "distro": "arch",
-                        "path": str(file),
-                    },
-                )
-            )
+def split_document(doc: Document, splitter) -> list:
+    """Schema-aware section chunks; plain text splitting for anything else."""
+    chunks = chunk_json(json.loads(doc.page_content), doc.metadata, CHUNK_SIZE)
+    if chunks is None:
+        chunks = splitter.split_documents([doc])
+        for i, chunk in enumerate(chunks):
+            chunk.metadata["chunk_index"] = i
+    return chunks
 
-    return documents
 
+MANIFEST_PATH = CHROMA_DIR / "manifest.json"
+# Bump when chunk rendering changes so the manifest triggers a rebuild
+CHUNKER_VERSION = "sections-v1"
 
-def load_ubuntu_wiki_docs():
-    documents = []
 
-    for domain_dir in UBUNTU_WIKI_DIR.iterdir():
-        if not domain_dir.is_dir():
-            continue
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
 
-        domain = domain_dir.name
 
-        for file in domain_dir.glob("*.json"):
-            topic = file.stem
+def _chunk_id(path: str, chunk: Document) -> str:
+    # Same file + same text + same offset -> same id, so unchanged chunks are skipped
+    key = f"{path}\x00{chunk.metadata.get('chunk_index')}\x00{chunk.page_content}"
+    return _sha256(key.encode("utf-8"))
 
-            with open(file, "r", encoding="utf-8") as f:
-                content = json.load(f)
 
-            text = json.dumps(content, indent=2, ensure_ascii=False)
+def _load_manifest() -> dict:
+    try:
+        with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
 
-            documents.append(
-                Document(
-                    page_content=text,
-                    metadata={
-                        "source": "ubuntu_docs",
-                        "domain": domain,
-                        "topic": topic,
-                        "os": "linux",
-                        "distro": "ubuntu",
-                        "path": str(file),
-                    },
-                )
-            )
 
-    return documents
+def _save_manifest(manifest: dict):
+    MANIFEST_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = MANIFEST_PATH.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    tmp.replace(MANIFEST_PATH)
 
 
 def ingest():
-    print("📥 Loading Arch Wiki docs...")
-    docs = load_arch_wiki_docs()
-
-    print("📥 Loading Ubuntu docs...")
-    docs.extend(load_ubuntu_wiki_docs())
-
-    print("📥 Loading Windows docs...")
-    docs.extend(load_windows_docs())
-
+    # Fallback for files that don't follow the system_knowledge schema
     splitter = RecursiveCharacterTextSplitter(
         chunk_size=CHUNK_SIZE,
         chunk_overlap=CHUNK_OVERLAP,
-        add_start_index=True,
     )
 
-    splits = splitter.split_documents(docs)
-
-    print(f"✂️ Total chunks: {len(splits)}")
-
     vectorstore = Chroma(
         collection_name="main_corpus",
         embedding_function=embeddings,
         persist_directory=str(CHROMA_DIR),
     )
 
-    vectorstore.reset_collection()
-    vectorstore.add_documents(splits)
+    # Chunk ids are only comparable if chunking and embedding are unchanged
+    settings = {
+        "chunker": CHUNKER_VERSION,
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "embed_model": EMBED_MODEL_NAME,
+        "embed_backend": EMBED_BACKEND,
+    }
+    manifest = _load_manifest()
+    same_settings = manifest.get("settings") == settings
+    previous = manifest.get("files", {}) if same_settings else {}
+
+    files = {}
+    # What the collection actually holds, not what the manifest says it
+    # should: a reset or restored collection gets its missing chunks back
+    existing = set(vectorstore.get(include=[])["ids"])
+    # Chunk ids don't cover the settings: after a model or chunker change every
+    # stored vector is stale, so nothing counts as already embedded
+    embedded = existing if same_settings else set()
+
+    def new_chunks():
+        """Streams (id, chunk) for chunks missing from the collection, one file at a time."""
+        for file, entry, domain in iter_source_files():
+            path = str(file)
+            raw = file.read_bytes()
+            file_hash = _sha256(raw)
+            known = previous.get(path, {})
+            if known.get("sha256") == file_hash and embedded.issuperset(known.get("chunk_ids", [])):
+                files[path] = known
+                continue
+            print(f"📥 {entry['source']}/{domain}/{file.name}")
+            splits = split_document(make_document(file, entry, domain, raw), splitter)
+            ids = [_chunk_id(path, chunk) for chunk in splits]
+            files[path] = {"sha256": file_hash, "chunk_ids": ids}
+            for chunk, chunk_id in zip(splits, ids):
+                if chunk_id not in embedded:
+                    yield chunk_id, chunk
+
+    def write(ids, vectors, texts, metadatas):
+        vectorstore._collection.upsert(
+            ids=ids, embeddings=vectors, documents=texts, metadatas=metadatas
+        )
+
+    # Add before deleting, so the collection is never empty mid-ingest
+    added = embed_and_write(
+        new_chunks(),
+        write,
+        EMBED_MODEL_NAME,
+        embeddings=embeddings,
+        batch_size=EMBED_BATCH_SIZE,
+        workers=EMBED_WORKERS,
+        backend=EMBED_BACKEND,
+        onnx_file=EMBED_ONNX_FILE,
+    )
+
+    wanted = {chunk_id for entry in files.values() for chunk_id in entry["chunk_ids"]}
+    print(f"✂️ Total chunks: {len(wanted)} ({added} new or changed)")
+
+    # Covers edited chunks, removed files and collections built before the manifest
+    stale = list(existing - wanted)
+    if stale:
+        vectorstore.delete(ids=stale)
+        print(f"🗑️ Removed {len(stale)} stale chunks")
+
+    _save_manifest({"settings": settings, "files": files})
+
+    # Lexical index and mmap snapshot over exactly what is in the collection now
+    indexed = vectorstore._collection.get(include=["embeddings", "documents", "metadatas"])
+    BM25Index.build(indexed["ids"], indexed["documents"], indexed["metadatas"]).save(BM25_INDEX_PATH)
+    print(f"🔎 BM25 index written to {BM25_INDEX_PATH}")
+    version = write_snapshot(
+        SNAPSHOT_DIR,
+        indexed["ids"],
+        indexed["embeddings"],
+        indexed["documents"],
+        indexed["metadatas"],
+        settings,
+    )
+    print(f"🗺️ Snapshot {version} written to {SNAPSHOT_DIR}")
 
     print("✅ Main corpus ingestion complete.")
 
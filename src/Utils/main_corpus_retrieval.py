@@ -1,17 +1,186 @@
 # main_corpus_retrieval.py
-from langchain_chroma import Chroma
-from src.Utils.rag_config import CHROMA_DIR, embeddings as _embeddings, TOP_K
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-_vectorstore = Chroma(
-    collection_name="main_corpus",
-    embedding_function=_embeddings,
-    persist_directory=str(CHROMA_DIR),
+from src.Utils.bm25_index import BM25Index
+from src.Utils.corpus_snapshot import SnapshotPointer, open_snapshot
+from src.Utils.lazy_init import LazyResource
+from src.Utils.query_analyzer import QueryAnalyzer, to_where
+from src.Utils.reranker import reranker
+from src.Utils.rag_config import (
+    BM25_INDEX_PATH,
+    CHROMA_DIR,
+    HYBRID_CANDIDATES,
+    MIN_FILTERED_HITS,
+    RERANK_CANDIDATES,
+    RERANK_TOP_N,
+    RRF_K,
+    SNAPSHOT_DIR,
+    TOP_K,
+    VECTOR_BACKEND,
+    embeddings as _embeddings,
 )
+from src.Utils.single_flight import normalize_key, retrieval_flight
+from src.Utils.vector_index import NumpyVectorIndex
 
-_retriever = _vectorstore.as_retriever(
-    search_kwargs={"k": TOP_K}
+
+def _import_chroma():
+    from langchain_chroma import Chroma
+
+    return Chroma
+
+
+# Opened on first search (or by the startup warmup), not at import
+_vectorstore = LazyResource(
+    "vectorstore",
+    load=_import_chroma,
+    build=lambda Chroma: Chroma(
+        collection_name="main_corpus",
+        embedding_function=_embeddings,
+        persist_directory=str(CHROMA_DIR),
+    ),
 )
 
+_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="retrieval")
+
+# BM25 index and the query analyzer built from its metadata, reloaded when
+# ingestion rewrites the file
+_bm25 = None
+_analyzer = QueryAnalyzer({})
+_bm25_mtime = None
+_bm25_lock = threading.Lock()
+
+
+def _bm25_index():
+    global _bm25, _analyzer, _bm25_mtime
+    try:
+        mtime = BM25_INDEX_PATH.stat().st_mtime_ns
+    except OSError:
+        return None
+    with _bm25_lock:
+        if mtime != _bm25_mtime:
+            _bm25 = BM25Index.load(BM25_INDEX_PATH)
+            _analyzer = QueryAnalyzer.from_metadatas(_bm25.metadatas)
+            _bm25_mtime = mtime
+        return _bm25
+
+
+# Matrix index for the numpy backend, replaced (never modified) when
+# ingestion publishes a new snapshot; read from the collection if there is none
+_matrix_index = None
+_matrix_version = None
+_matrix_lock = threading.Lock()
+_snapshot_pointer = SnapshotPointer(SNAPSHOT_DIR)
+
+
+def _numpy_index():
+    global _matrix_index, _matrix_version
+    version = _snapshot_pointer.get()
+    index = _matrix_index
+    if index is not None and version == _matrix_version:
+        return index
+    with _matrix_lock:
+        if _matrix_index is None or version != _matrix_version:
+            if version is not None:
+                # One file map per worker; the pages are shared with every other worker
+                _matrix_index = open_snapshot(version)
+            else:
+                data = _vectorstore.get()._collection.get(
+                    include=["embeddings", "documents", "metadatas"]
+                )
+                _matrix_index = NumpyVectorIndex.from_collection(data)
+            _matrix_version = version
+        return _matrix_index
+
+
+def _doc_key(doc):
+    return doc.id or doc.page_content
+
+
+def _use_numpy() -> bool:
+    if VECTOR_BACKEND == "auto":
+        return _snapshot_pointer.get() is not None
+    return VECTOR_BACKEND == "numpy"
+
+
+def _dense(query: str, k: int, fields=None):
+    if _use_numpy():
+        return _numpy_index().documents(_embeddings.vector(query), k, fields)
+    return _vectorstore.get().similarity_search(query, k=k, filter=to_where(fields or {}))
+
+
+def _lexical(query: str, k: int, fields=None):
+    index = _bm25_index()
+    return index.documents(query, k, fields) if index else []
+
+
+def _fuse(rankings, k: int):
+    """Reciprocal rank fusion of several best-first result lists."""
+    scores, docs = {}, {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            key = _doc_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank + 1)
+            docs.setdefault(key, doc)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [docs[key] for key in best]
+
+
+def _hybrid_search(query: str, fields=None, k: int = TOP_K):
+    lexical = _pool.submit(_lexical, query, HYBRID_CANDIDATES, fields)
+    dense = _dense(query, HYBRID_CANDIDATES, fields)
+    return _fuse([dense, lexical.result()], k)
+
+
+def _filter_levels(fields: dict):
+    """Filters to try in order: everything detected, os/distro only, none."""
+    levels = [fields]
+    if "domain" in fields:
+        levels.append({k: v for k, v in fields.items() if k != "domain"})
+    if levels[-1]:
+        levels.append({})
+    return levels
+
+
+def _filtered_search(query: str, fields: dict):
+    docs = []
+    for level in _filter_levels(fields):
+        docs = _hybrid_search(query, level, RERANK_CANDIDATES)
+        if len(docs) >= MIN_FILTERED_HITS:
+            break
+    # Wide candidate set in, only the best few chunks out to the prompt
+    return reranker.rerank(query, docs, RERANK_TOP_N)
+
+
+def analyze_query(query: str, context: str = "") -> dict:
+    _bm25_index()
+    return _analyzer.analyze(query, context)
+
+
+def retrieve_main_corpus(query: str, context: str = ""):
+    """
+    Top chunks for query, searched within the os/distro/domain detected from
+    the question (and the chat context), widening the filter if too few hits.
+    """
+    fields = analyze_query(query, context)
+    key = normalize_key(query, sorted(fields.items()))
+    # Identical concurrent queries share one search
+    return list(retrieval_flight.do(key, _filtered_search, query, fields))
+
+
+def warm_up_retrieval():
+    if _use_numpy():
+        _numpy_index()
+    else:
+        _vectorstore.get()
+    _bm25_index()
+    reranker.load()
+
 
-def retrieve_main_corpus(query: str):
-    return _retriever.invoke(query)
+def corpus_version() -> str:
+    """
+    Id of the snapshot the last ingest published. It is derived from the
+    chunk ids and settings, so it only changes when the corpus does.
+    """
+    snapshot = _snapshot_pointer.get()
+    return snapshot.name if snapshot else ""
@@ -0,0 +1,105 @@
+# prompt_builder.py
+import logging
+from functools import lru_cache
+
+import tiktoken
+
+from src.Utils.rag_config import PROMPT_TOKEN_BUDGET, PROMPT_TOKENIZER
+
+logger = logging.getLogger(__name__)
+
+# Don't bother keeping a truncated part smaller than this
+MIN_PART_TOKENS = 48
+
+# Joins chunks and turns; recent_messages is also wrapped in it
+_SEPARATOR = "\n\n"
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    return tiktoken.get_encoding(PROMPT_TOKENIZER)
+
+
+def count_tokens(text: str) -> int:
+    return len(_encoding().encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    tokens = _encoding().encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return _encoding().decode(tokens[:max_tokens]) + " ..."
+
+
+@lru_cache(maxsize=1)
+def _overhead():
+    """Tokens of one separator and of the marker truncate_tokens appends."""
+    return count_tokens(_SEPARATOR), count_tokens(" ...")
+
+
+def _fill(parts, remaining):
+    """
+    Take parts in order while they fit; truncate the first that doesn't, then
+    stop. Every part after the first also pays for its separator.
+    """
+    separator, marker = _overhead()
+    kept = []
+    for part in parts:
+        cost = separator if kept else 0
+        n = count_tokens(part)
+        if cost + n <= remaining:
+            kept.append(part)
+            remaining -= cost + n
+            continue
+        if remaining - cost >= MIN_PART_TOKENS:
+            kept.append(truncate_tokens(part, remaining - cost - marker))
+            remaining = 0
+        break
+    return kept, remaining
+
+
+def build_prompt_inputs(question, chunks, turns, summary, overhead_tokens=0, budget=PROMPT_TOKEN_BUDGET):
+    """
+    Fit the prompt variables into a token budget.
+
+    Priority is question, then chunks (best first), then recent turns (newest
+    first), then the running summary. Whatever doesn't fit is truncated or
+    dropped.
+    """
+    question_tokens = count_tokens(question)
+    remaining = max(budget - overhead_tokens - question_tokens, 0)
+
+    separator, marker = _overhead()
+    kept_chunks, remaining = _fill(chunks, remaining)
+    # The separators around recent_messages are only spent if a turn is kept
+    kept_turns, left = _fill(list(reversed(turns)), max(remaining - 2 * separator, 0))
+    if kept_turns:
+        remaining = left
+    kept_turns.reverse()
+    if summary and remaining >= MIN_PART_TOKENS:
+        summary = truncate_tokens(summary, remaining - marker)
+    else:
+        summary = ""
+
+    context = _SEPARATOR.join(kept_chunks)
+    recent_messages = _SEPARATOR + _SEPARATOR.join(kept_turns) + _SEPARATOR if kept_turns else ""
+
+    context_tokens = count_tokens(context)
+    recent_tokens = count_tokens(recent_messages)
+    summary_tokens = count_tokens(summary)
+    logger.info(
+        "prompt tokens: total=%d budget=%d overhead=%d question=%d "
+        "context=%d (%d/%d chunks) recent=%d (%d/%d turns) summary=%d",
+        overhead_tokens + question_tokens + context_tokens + recent_tokens + summary_tokens,
+        budget, overhead_tokens, question_tokens,
+        context_tokens, len(kept_chunks), len(chunks),
+        recent_tokens, len(kept_turns), len(turns),
+        summary_tokens,
+    )
+
+    return {
+        "context": context,
+        "question": question,
+        "summary": summary,
+        "recent_messages": recent_messages,
+    }
@@ -0,0 +1,113 @@
+# query_analyzer.py
+from collections import Counter, defaultdict
+
+from src.Utils.bm25_index import tokenize
+
+OS_KEYWORDS = {
+    "windows": {
+        "windows", "win10", "win11", "powershell", "cmd", "powercfg", "chkdsk", "sfc",
+        "dism", "eventvwr", "services.msc", "msconfig", "registry", "bsod", "ntfs",
+    },
+    "linux": {
+        "linux", "ubuntu", "arch", "debian", "fedora", "manjaro", "systemd", "systemctl",
+        "journalctl", "apt", "pacman", "sudo", "kernel", "grub", "tlp", "cpupower",
+        "lm_sensors", "sensors", "fsck", "smartctl", "ext4", "dmesg",
+    },
+}
+DISTRO_KEYWORDS = {
+    "ubuntu": {"ubuntu", "apt", "apt-get", "snap", "debian", "kubuntu", "xubuntu", "mint"},
+    "arch": {"arch", "pacman", "aur", "yay", "manjaro", "endeavouros", "archlinux"},
+}
+OS_PHRASES = {"windows": ("event viewer", "task manager", "device manager")}
+# Common question words the corpus tags don't cover
+DOMAIN_HINTS = {
+    "throttling": "thermal", "throttle": "thermal", "temperature": "thermal", "hot": "thermal",
+    "fan": "thermal", "overheat": "thermal", "drain": "battery", "charging": "battery",
+    "charge": "battery", "ssd": "disk", "hdd": "disk", "space": "disk", "journalctl": "systemd",
+    "systemctl": "systemd", "service": "systemd",
+}
+# Tags too broad to point at one domain
+GENERIC_TAGS = {"usage", "failure", "troubleshooting", "performance", "monitoring", "laptop", "power"}
+
+
+class QueryAnalyzer:
+    """
+    Guesses the target os, distro and domain of a question.
+
+    OS and distro come from fixed keyword tables; domain keywords are built
+    from the corpus tags (a tag counts if it almost always belongs to one
+    domain). The result is a plain {field: value} dict for metadata filters.
+    """
+
+    def __init__(self, domain_keywords):
+        self.domain_keywords = domain_keywords
+        self._domain_table = defaultdict(set)
+        for keyword, domain in domain_keywords.items():
+            self._domain_table[domain].add(keyword)
+
+    @classmethod
+    def from_metadatas(cls, metadatas, purity=0.8):
+        counts = defaultdict(Counter)
+        for meta in metadatas:
+            domain = meta.get("domain")
+            if not domain:
+                continue
+            counts[domain][domain] += 1
+            for tag in filter(None, (meta.get("tags") or "").split(",")):
+                counts[tag.strip().lower()][domain] += 1
+        keywords = {k: v for k, v in DOMAIN_HINTS.items() if v in counts}
+        for tag, by_domain in counts.items():
+            domain, n = by_domain.most_common(1)[0]
+            if tag not in GENERIC_TAGS and n / sum(by_domain.values()) >= purity:
+                keywords[tag] = domain
+        return cls(keywords)
+
+    @staticmethod
+    def _vote(tokens, text, table, phrases=None):
+        votes = Counter()
+        for label, words in table.items():
+            votes[label] += sum(1 for t in tokens if t in words)
+        for label, items in (phrases or {}).items():
+            votes[label] += sum(1 for p in items if p in text)
+        ranked = votes.most_common(2)
+        if not ranked or ranked[0][1] == 0:
+            return None
+        if len(ranked) > 1 and ranked[1][1] == ranked[0][1]:
+            return None  # ambiguous
+        return ranked[0][0]
+
+    def _detect(self, text: str) -> dict:
+        text = text.lower()
+        tokens = tokenize(text)
+        found = {}
+        os_name = self._vote(tokens, text, OS_KEYWORDS, OS_PHRASES)
+        distro = self._vote(tokens, text, DISTRO_KEYWORDS)
+        if distro:
+            os_name = "linux"
+            found["distro"] = distro
+        if os_name:
+            found["os"] = os_name
+        domain = self._vote(tokens, text, self._domain_table)
+        if domain:
+            found["domain"] = domain
+        return found
+
+    def analyze(self, query: str, context: str = "") -> dict:
+        """Fields found in the question win; the chat context fills the gaps."""
+        found = self._detect(query)
+        if context:
+            for field, value in self._detect(context).items():
+                if field == "domain":
+                    continue  # the topic of earlier turns says little about this one
+                found.setdefault(field, value)
+        if found.get("os") == "windows":
+            found.pop("distro", None)
+        return found
+
+
+def to_where(fields: dict):
+    """Chroma where clause for an analyzer result."""
+    clauses = [{k: v} for k, v in fields.items()]
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
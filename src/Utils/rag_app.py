@@ -1,11 +1,37 @@
 # rag_app.py
+import json
+import logging
+import re
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+
+import numpy as np
 import streamlit as st
-from langchain_ollama import OllamaLLM
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
+from src.Utils.admission import admission, current_user
+from src.Utils.chat_memory import recall_chats
 from src.Utils.head_query import gather_context
-from src.Utils.rag_config import llm
+from src.Utils.lazy_init import resource_timings
+from src.Utils.main_corpus_retrieval import corpus_version, warm_up_retrieval
+from src.Utils.prompt_builder import build_prompt_inputs, count_tokens
+from src.Utils.rag_config import (
+    CHAT_MODEL_NAME,
+    METRICS_LOG_INTERVAL_S,
+    SUMMARY_MODEL,
+    embeddings,
+    get_chat_model,
+    model_metrics,
+)
+from src.Utils.response_cache import history_scope, response_cache
+from src.Utils.single_flight import answer_flight, normalize_key
+from src.Utils.system_report_index import report_partition
+from src.Utils.user_docs import user_partition
+
+logger = logging.getLogger(__name__)
 
 
 PROMPT = ChatPromptTemplate.from_template(
@@ -18,6 +44,9 @@ If the answer is unknown, say so.
 Context:
 {context}
 
+Related Past Chats:
+{past_chats}
+
 Previous Messages:\n
 Summary:\n
 {summary}
@@ -35,34 +64,295 @@ def format_docs(docs):
         for d in docs
     )
 
-def answer_query(query: str):
-    contexts = gather_context(query)
-
-    main_context = format_docs(contexts["main"])
-
-    chain = PROMPT | llm | StrOutputParser()
-
+def _chat_history():
+    """Running summary and the last 5 turns, each formatted as one string."""
     try:   
         summary = st.session_state.chat_id[st.session_state.current_chat_id]["summary"]
         messages = st.session_state.chat_id[st.session_state.current_chat_id]["user_messages"][-5:]
         responses = st.session_state.chat_id[st.session_state.current_chat_id]["llm_responses"][-5:]
         if len(messages) == 0:
             summary = ""
-            recent_messages = ""
+            turns = []
         else:
-            recent_messages = "\n\n" + "\n\n".join(
+            turns = [
                 f"User : {m}\nLLM: {r}"
                 for m, r in zip(messages, responses)
-            ) + "\n\n"
+            ]
     except Exception as e:
         summary = ""
-        recent_messages =""
-
-    return chain.invoke(
-        {
-            "context": main_context,
-            "question": query,
-            "summary": summary,
-            "recent_messages": recent_messages,
-        }
+        turns = []
+    return summary, turns
+
+@lru_cache(maxsize=1)
+def _prompt_overhead():
+    """Tokens taken by the template itself."""
+    return count_tokens(PROMPT.format(context="", question="", summary="", recent_messages="", past_chats=""))
+
+def _recall(query: str, user: str) -> str:
+    """Summaries of related earlier chats, within their own fixed budget."""
+    return recall_chats(user, query, exclude_chat_id=st.session_state.get("current_chat_id"))
+
+def _build_inputs(query: str, summary: str, turns, tier: str = "full", user: str = "", past_chats: str = ""):
+    if tier == "light":
+        chunks = []
+        past_chats = ""
+    else:
+        # Recent user messages help pin down the os/distro of a follow-up
+        contexts = gather_context(query, "\n".join(t.split("\nLLM:")[0] for t in turns[-2:]), user)
+        # The user's own runbooks and system reports first: they are the most
+        # specific to their setup
+        chunks = [format_docs([d]) for d in contexts["user"] + contexts["system"] + contexts["main"]]
+
+    inputs = build_prompt_inputs(
+        query, chunks, turns, summary, overhead_tokens=_prompt_overhead() + count_tokens(past_chats)
     )
+    inputs["past_chats"] = past_chats
+    return inputs
+
+def _cache_key(query: str, summary: str, turns, user: str = "", past_chats: str = ""):
+    # Scoped by the summaries actually recalled for this query, not by the
+    # memory's version: a chat saved elsewhere only matters if it is recalled
+    partition = user_partition(user) + report_partition(user) + past_chats
+    scope = history_scope(summary, "\n\n".join(turns), partition)
+    return embeddings.vector(query), scope, corpus_version()
+
+# --- Query routing ---
+# "light": no retrieval, answered by SUMMARY_MODEL (greetings, thanks, short
+# follow-ups about the chat so far). "full": retrieval + CHAT_MODEL_NAME.
+
+_SMALL_TALK = re.compile(
+    r"^\s*(hi|hello|hey|yo|thanks|thank you|thx|ty|ok|okay|cool|great|nice|awesome|"
+    r"perfect|got it|bye|goodbye|good (morning|afternoon|evening|night))\b[\s!.,?]*",
+    re.IGNORECASE,
+)
+# What may follow a pleasantry for the message to still count as small talk
+_FILLER = re.compile(
+    r"\b(there|again|so|very|much|a|lot|all|everyone|guys|man|mate|buddy|bot|"
+    r"for|the|your|you|help|it|that|works?|worked)\b|[\s!.,?:;)(-]+",
+    re.IGNORECASE,
+)
+_FOLLOW_UP = re.compile(
+    r"\b(that|this|it|above|previous|last|again|earlier|you said|what do you mean)\b",
+    re.IGNORECASE,
+)
+_TECHNICAL = re.compile(
+    r"\b(cpu|gpu|ram|memory|disk|ssd|hdd|battery|thermal|temp\w*|fan|overheat\w*|"
+    r"throttl\w*|boot|kernel|driver|service|systemd|journalctl|tlp|governor|smart|"
+    r"fsck|chkdsk|error|crash\w*|freez\w*|slow|lag\w*|install|update|windows|linux|"
+    r"ubuntu|arch|sudo|command|log|event viewer|power|sleep|suspend)\b",
+    re.IGNORECASE,
+)
+_LIGHT_EXAMPLES = [
+    "hello", "hi there", "thanks a lot", "thank you, that worked", "ok got it",
+    "what command was that?", "can you repeat that?", "what did you mean?",
+    "summarize what we discussed", "bye",
+]
+_FULL_EXAMPLES = [
+    "why is my cpu throttling", "how to check battery health", "my laptop is overheating",
+    "disk is almost full", "system fails to boot", "service keeps crashing",
+    "how do I read journalctl logs", "fan is always loud",
+]
+_ROUTE_MARGIN = 0.05
+_route_vectors = {}
+
+def _example_vectors(tier: str):
+    if tier not in _route_vectors:
+        examples = _LIGHT_EXAMPLES if tier == "light" else _FULL_EXAMPLES
+        vectors = np.asarray(embeddings.embed_documents(examples), dtype=np.float32)
+        _route_vectors[tier] = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    return _route_vectors[tier]
+
+def _similarities(vector):
+    q = np.asarray(vector, dtype=np.float32)
+    q = q / (np.linalg.norm(q) or 1.0)
+    light = float(np.max(_example_vectors("light") @ q))
+    full = float(np.max(_example_vectors("full") @ q))
+    return light, full
+
+def _is_small_talk(query: str) -> bool:
+    """True only if nothing substantive is left once the pleasantries are stripped."""
+    rest = query
+    while True:
+        match = _SMALL_TALK.match(rest)
+        if not match:
+            break
+        rest = rest[match.end():]
+    return rest != query and not _FILLER.sub("", rest).strip()
+
+def route_query(query: str, vector, has_history: bool) -> str:
+    words = query.split()
+    if len(words) > 12:
+        return "full"
+    # "hi, wifi keeps dropping" is a question, not a greeting
+    if _is_small_talk(query):
+        return "light"
+    if not has_history:
+        return "full"
+    # Technical follow-ups ("is it the tlp service?") need retrieval too
+    if _TECHNICAL.search(query):
+        return "full"
+    # Short questions about the conversation so far ("what did you mean by that?")
+    if _FOLLOW_UP.search(query) and len(words) <= 8:
+        light, full = _similarities(vector)
+        return "light" if light >= full - _ROUTE_MARGIN else "full"
+    light, full = _similarities(vector)
+    return "light" if light > full + _ROUTE_MARGIN else "full"
+
+
+class RouterStats:
+    """Routing decisions and end-to-end latency per tier."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tiers = {}
+
+    def record(self, tier: str, elapsed: float):
+        with self._lock:
+            t = self._tiers.setdefault(tier, {"count": 0, "latencies": deque(maxlen=1000)})
+            t["count"] += 1
+            t["latencies"].append(elapsed)
+
+    def snapshot(self):
+        with self._lock:
+            out = {}
+            for tier, t in self._tiers.items():
+                lat = sorted(t["latencies"])
+                out[tier] = {
+                    "count": t["count"],
+                    "p50_s": lat[len(lat) // 2] if lat else 0.0,
+                    "p95_s": lat[int(len(lat) * 0.95)] if lat else 0.0,
+                }
+            return out
+
+
+router_stats = RouterStats()
+
+def _chain(ticket, tier: str = "full"):
+    # Light turns and shed load go to the smaller model
+    model = get_chat_model(SUMMARY_MODEL if tier == "light" or ticket.shed else CHAT_MODEL_NAME, 0.5)
+    return PROMPT | model | StrOutputParser()
+
+def _generate(query: str, summary: str, turns, user: str, tier: str, past_chats: str):
+    inputs = _build_inputs(query, summary, turns, tier, user, past_chats)
+    with admission.admit(user) as ticket:
+        return _chain(ticket, tier).invoke(inputs)
+
+def answer_query(query: str):
+    started = time.perf_counter()
+    user = current_user()
+    summary, turns = _chat_history()
+    past_chats = _recall(query, user)
+    vector, scope, version = _cache_key(query, summary, turns, user, past_chats)
+    cached = response_cache.get(vector, scope, version)
+    if cached is not None:
+        router_stats.record("cache", time.perf_counter() - started)
+        return cached
+
+    tier = route_query(query, vector, bool(turns))
+    # Identical concurrent questions in the same context share one LLM call
+    key = normalize_key(query, scope, version)
+    answer = answer_flight.do(key, _generate, query, summary, turns, user, tier, past_chats)
+    response_cache.put(query, vector, scope, version, answer)
+    router_stats.record(tier, time.perf_counter() - started)
+    return answer
+
+def stream_answer_query(query: str, on_queue=None):
+    """
+    Same as answer_query, but yields the answer text chunk by chunk.
+    on_queue(position) is called while waiting for a model slot.
+    """
+    started = time.perf_counter()
+    user = current_user()
+    summary, turns = _chat_history()
+    past_chats = _recall(query, user)
+    vector, scope, version = _cache_key(query, summary, turns, user, past_chats)
+    cached = response_cache.get(vector, scope, version)
+    if cached is not None:
+        router_stats.record("cache", time.perf_counter() - started)
+        yield cached
+        return
+
+    tier = route_query(query, vector, bool(turns))
+    key = normalize_key(query, scope, version)
+    call, leader = answer_flight.begin(key)
+    if not leader:
+        # Someone is already generating this answer; wait and show it whole
+        yield answer_flight.wait(call)
+        return
+
+    parts = []
+    try:
+        inputs = _build_inputs(query, summary, turns, tier, user, past_chats)
+        with admission.admit(user, on_wait=on_queue) as ticket:
+            for chunk in _chain(ticket, tier).stream(inputs):
+                if chunk:
+                    parts.append(chunk)
+                    yield chunk
+    except BaseException as e:
+        answer_flight.finish(key, call, error=e)
+        raise
+    answer = "".join(parts)
+    answer_flight.finish(key, call, result=answer)
+    response_cache.put(query, vector, scope, version, answer)
+    router_stats.record(tier, time.perf_counter() - started)
+
+
+def warm_up():
+    """Steps for the background warmup after the first page render."""
+    def embedding_model():
+        embeddings.vector("warm up")
+
+    def router():
+        _example_vectors("light")
+        _example_vectors("full")
+
+    def chat_models():
+        get_chat_model(CHAT_MODEL_NAME, 0.5)
+        get_chat_model(SUMMARY_MODEL, 0.5)
+        get_chat_model(SUMMARY_MODEL, 0.0)
+
+    return [embedding_model, warm_up_retrieval, router, _prompt_overhead, chat_models]
+
+
+def metrics_snapshot() -> dict:
+    """Everything the app measures, in one dict."""
+    return {
+        "models": model_metrics.snapshot(),
+        "router": router_stats.snapshot(),
+        "response_cache": response_cache.stats(),
+        "admission": admission.stats(),
+        "startup": resource_timings(),
+    }
+
+
+_metrics_started = False
+_metrics_lock = threading.Lock()
+
+
+def start_metrics_log(interval: float = METRICS_LOG_INTERVAL_S):
+    """Logs metrics_snapshot() every interval seconds on a background thread, once per process."""
+    global _metrics_started
+    with _metrics_lock:
+        if _metrics_started or interval <= 0:
+            return
+        _metrics_started = True
+    if not logging.getLogger().handlers:
+        # Nothing configures logging in the app, so INFO would be dropped
+        logger.addHandler(logging.StreamHandler())
+        logger.setLevel(logging.INFO)
+
+    def _run():
+        last = None
+        while True:
+            time.sleep(interval)
+            try:
+                report = json.dumps(metrics_snapshot(), default=str, sort_keys=True)
+            except Exception as e:
+                logger.warning("metrics snapshot failed: %s", e)
+                continue
+            # Quiet while the app is idle
+            if report != last:
+                logger.info("metrics %s", report)
+                last = report
+
+    threading.Thread(target=_run, name="metrics-log", daemon=True).start()
@@ -8,13 +8,33 @@ LINUX_DIR = SYSTEM_CORPUS_DIR / "linux"
 ARCH_WIKI_DIR = LINUX_DIR / "arch_wiki" 
 UBUNTU_WIKI_DIR = LINUX_DIR / "ubuntu_wiki"
 CHROMA_DIR = Path("chroma_db/main_corpus")
+BM25_INDEX_PATH = Path("chroma_db/main_corpus_bm25.json")
+SNAPSHOT_DIR = Path("chroma_db/main_corpus_snapshots")
+USER_DOCS_DIR = Path("chroma_db/user_docs")
+SYSTEM_REPORTS_DIR = Path("chroma_db/system_reports")
+CHAT_MEMORY_DIR = Path("chroma_db/chat_memory")
 WINDOWS_DOCS_DIR = SYSTEM_CORPUS_DIR / "windows"
+# Anchored to this file: the benchmark runs from the repo root as a module
+BENCHMARK_DIR = Path(__file__).parent / "data" / "benchmarks"
+
+# Corpus sources: <dir>/<domain>/<topic>.json, tagged with this metadata.
+# Adding a distro only needs a new entry here.
+CORPUS_SOURCES = [
+    {"dir": ARCH_WIKI_DIR, "source": "arch_wiki", "os": "linux", "distro": "arch"},
+    {"dir": UBUNTU_WIKI_DIR, "source": "ubuntu_docs", "os": "linux", "distro": "ubuntu"},
+    {"dir": WINDOWS_DOCS_DIR, "source": "windows_docs", "os": "windows", "distro": "10/11"},
+]
 
 # Models
 import streamlit as st
 import os
-from langchain_groq import ChatGroq
-from langchain_huggingface import HuggingFaceEmbeddings
+import threading
+import time
+import httpx
+from langchain_core.callbacks import BaseCallbackHandler
+from src.Utils.embedding_backends import load_embeddings
+from src.Utils.embedding_cache import CachedQueryEmbeddings
+from src.Utils.lazy_init import LazyEmbeddings, LazyResource
 
 # 1. Load Secrets
 # Ensure you have GROQ_API_KEY in your .streamlit/secrets.toml or Docker ENV
@@ -23,21 +43,213 @@ GROQ_API_KEY = st.secrets.get("GROQ_API_KEY", os.getenv("GROQ_API_KEY"))
 # 2. Setup Embeddings (Runs locally on CPU, no API needed)
 # This replaces OllamaEmbeddings
 EMBED_MODEL_NAME = "all-MiniLM-L6-v2" 
-embeddings = HuggingFaceEmbeddings(model_name=EMBED_MODEL_NAME)
+# "torch" (sentence-transformers) or "onnx" (int8 export on onnxruntime, no torch import).
+# Check the two agree with: python -m src.Utils.embedding_backends
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")
+EMBED_ONNX_FILE = os.getenv("EMBED_ONNX_FILE", "onnx/model_quint8_avx2.onnx")
+EMBED_THREADS = int(os.getenv("EMBED_THREADS", 2))
+# Repeated queries reuse their vector; set QUERY_EMBED_CACHE_PATH to keep it across restarts
+QUERY_EMBED_CACHE_SIZE = 4096
+QUERY_EMBED_CACHE_PATH = os.getenv("QUERY_EMBED_CACHE_PATH")
+
+
+def _import_embedding_backend():
+    if EMBED_BACKEND == "onnx":
+        import onnxruntime, tokenizers  # noqa: F401
+    else:
+        import langchain_huggingface  # noqa: F401  (pulls in torch)
+    return load_embeddings
+
+
+# The model itself is only loaded on first use (or by the startup warmup)
+embedding_model = LazyResource(
+    "embeddings",
+    load=_import_embedding_backend,
+    build=lambda load: load(EMBED_BACKEND, EMBED_MODEL_NAME, EMBED_ONNX_FILE, EMBED_THREADS),
+)
+embeddings = CachedQueryEmbeddings(
+    LazyEmbeddings(embedding_model),
+    f"{EMBED_MODEL_NAME}:{EMBED_BACKEND}",
+    maxsize=QUERY_EMBED_CACHE_SIZE,
+    path=QUERY_EMBED_CACHE_PATH,
+)
 
 # 3. Setup LLM (Groq)
 # This replaces OllamaLLM
 SUMMARY_MODEL = "llama-3.1-8b-instant"
 CHAT_MODEL_NAME = "llama-3.3-70b-versatile" 
-llm = ChatGroq(
-    model=CHAT_MODEL_NAME,
-    api_key=GROQ_API_KEY,
-    temperature=0.5
+
+# One client per (model, temperature), all sharing a pooled HTTP transport
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 60))  # seconds
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 16))
+LLM_MAX_RETRIES = 2
+
+_http_clients = LazyResource(
+    "http_clients",
+    load=lambda: httpx,
+    build=lambda httpx: (
+        httpx.Client(
+            timeout=httpx.Timeout(LLM_TIMEOUT, connect=10.0),
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_CONNECTIONS,
+            ),
+        ),
+        httpx.AsyncClient(
+            timeout=httpx.Timeout(LLM_TIMEOUT, connect=10.0),
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_CONNECTIONS,
+            ),
+        ),
+    ),
 )
 
+
+class ModelMetrics(BaseCallbackHandler):
+    """Per-model call count, latency and token usage."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = {}
+        self._stats = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        elapsed = time.perf_counter() - self._started.pop(run_id, time.perf_counter())
+        output = response.llm_output or {}
+        usage = dict(output.get("token_usage") or {})
+        model = output.get("model_name")
+        for gens in response.generations:
+            for gen in gens:
+                message = getattr(gen, "message", None)
+                meta = getattr(message, "usage_metadata", None)
+                if meta and not usage:
+                    usage = {
+                        "prompt_tokens": meta.get("input_tokens", 0),
+                        "completion_tokens": meta.get("output_tokens", 0),
+                    }
+                if message is not None and not model:
+                    model = message.response_metadata.get("model_name")
+        self._record(model or "unknown", elapsed, usage)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._started.pop(run_id, None)
+
+    def _record(self, model, elapsed, usage):
+        with self._lock:
+            s = self._stats.setdefault(model, {
+                "calls": 0, "latency_s": 0.0, "max_latency_s": 0.0,
+                "prompt_tokens": 0, "completion_tokens": 0,
+            })
+            s["calls"] += 1
+            s["latency_s"] += elapsed
+            s["max_latency_s"] = max(s["max_latency_s"], elapsed)
+            s["prompt_tokens"] += usage.get("prompt_tokens") or 0
+            s["completion_tokens"] += usage.get("completion_tokens") or 0
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                model: {**s, "avg_latency_s": s["latency_s"] / s["calls"]}
+                for model, s in self._stats.items()
+            }
+
+
+model_metrics = ModelMetrics()
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_chat_model(model: str = CHAT_MODEL_NAME, temperature: float = 0.5):
+    """Returns the shared ChatGroq client for (model, temperature), creating it once."""
+    key = (model, temperature)
+    with _models_lock:
+        if key not in _models:
+            from langchain_groq import ChatGroq
+
+            http_client, http_async_client = _http_clients.get()
+            _models[key] = ChatGroq(
+                model=model,
+                api_key=GROQ_API_KEY,
+                temperature=temperature,
+                timeout=LLM_TIMEOUT,
+                max_retries=LLM_MAX_RETRIES,
+                http_client=http_client,
+                http_async_client=http_async_client,
+                callbacks=[model_metrics],
+            )
+        return _models[key]
+
 # Chunking
 CHUNK_SIZE = 900
 CHUNK_OVERLAP = 150
 
 # Retrieval
 TOP_K = 6
+HYBRID_CANDIDATES = 20  # per retriever, before reciprocal rank fusion
+RRF_K = 60
+MIN_FILTERED_HITS = 3  # fewer hits than this under a metadata filter widens the search
+# Dense search backend: "numpy" searches an in-process matrix without touching
+# SQLite per query. It maps the snapshot written by ingestion (shared across
+# worker processes) and only falls back to copying the Chroma collection when
+# there is none. "chroma" always queries Chroma. "auto" (the default) uses
+# numpy whenever a snapshot exists and Chroma otherwise.
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "auto")
+
+# Per-user uploaded documents
+USER_DOCS_TOP_K = 3
+USER_DOCS_MIN_SCORE = 0.3  # cosine; weaker matches from a user's uploads are left out
+USER_DOCS_MAX_BYTES = 2 * 1024 * 1024
+USER_PARTITION_CACHE_SIZE = 64  # hot tenants kept loaded in memory
+
+# Memory across a user's past chats, recalled from their summaries
+CHAT_MEMORY_TOP_K = 2
+CHAT_MEMORY_MIN_SCORE = 0.35
+CHAT_MEMORY_TOKEN_BUDGET = 300  # hard cap, taken out of PROMPT_TOKEN_BUDGET
+
+# Report windows at or above these are listed as anomalies in the report index
+REPORT_CPU_ALERT = 85
+REPORT_MEMORY_ALERT = 90
+REPORT_DISK_ALERT = 90
+REPORT_TEMP_ALERT = 85  # °C
+
+# Cross-encoder reranking of the fused candidates
+RERANK_CANDIDATES = 12
+RERANK_TOP_N = 4
+RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+RERANK_ONNX_FILE = "onnx/model.onnx"
+RERANK_MAX_LENGTH = 256
+RERANK_THREADS = 2
+RERANK_CACHE_SIZE = 4096
+# A failed model load is retried after this many seconds, doubling up to the max
+RERANK_RETRY_S = 30
+RERANK_RETRY_MAX_S = 900
+
+# Response cache
+RESPONSE_CACHE_SIZE = 512
+RESPONSE_CACHE_TTL = 60 * 60  # seconds
+RESPONSE_CACHE_THRESHOLD = 0.95  # cosine similarity
+
+# Prompt assembly
+PROMPT_TOKEN_BUDGET = 3000
+PROMPT_TOKENIZER = "cl100k_base"  # tiktoken encoding used to approximate llama token counts
+
+# Seconds a request waits on an identical in-flight one before giving up
+SINGLE_FLIGHT_TIMEOUT = 90
+
+# Admission control for model calls
+LLM_MAX_CONCURRENT = 8
+USER_RATE_PER_MIN = 10
+USER_BURST = 3
+ADMISSION_SHED_DEPTH = 16  # queued calls before falling back to SUMMARY_MODEL
+ADMISSION_MAX_WAIT = 60  # seconds
+
+# Model, router, cache and admission metrics are logged this often (0 disables)
+METRICS_LOG_INTERVAL_S = int(os.getenv("METRICS_LOG_INTERVAL_S", 300))
+
+# Ingestion embedding pipeline
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 256))
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", 1))  # >1 shards batches over a process pool
@@ -0,0 +1,122 @@
+# reranker.py
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from src.Utils.rag_config import (
+    RERANK_CACHE_SIZE,
+    RERANK_MAX_LENGTH,
+    RERANK_MODEL,
+    RERANK_ONNX_FILE,
+    RERANK_RETRY_MAX_S,
+    RERANK_RETRY_S,
+    RERANK_THREADS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class CrossEncoderReranker:
+    """
+    Scores (query, chunk) pairs with a small cross-encoder on onnxruntime.
+
+    All uncached pairs of a query go through the model as one padded batch;
+    scores are cached per (query hash, chunk id). If the model can't be
+    loaded or scoring fails, rerank() keeps the incoming order; a failed
+    load is retried with exponential backoff.
+    """
+
+    def __init__(self, model=RERANK_MODEL, onnx_file=RERANK_ONNX_FILE, max_length=RERANK_MAX_LENGTH,
+                 threads=RERANK_THREADS, cache_size=RERANK_CACHE_SIZE):
+        self.model = model
+        self.onnx_file = onnx_file
+        self.max_length = max_length
+        self.threads = threads
+        self.cache_size = cache_size
+        self._session = None
+        self._tokenizer = None
+        self._retry_at = 0.0
+        self._retry_delay = RERANK_RETRY_S
+        self._load_lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def load(self):
+        with self._load_lock:
+            if self._session is not None or time.monotonic() < self._retry_at:
+                return self._session is not None
+            try:
+                import onnxruntime as ort
+                from huggingface_hub import hf_hub_download
+                from tokenizers import Tokenizer
+
+                opts = ort.SessionOptions()
+                opts.intra_op_num_threads = self.threads
+                opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+                self._session = ort.InferenceSession(
+                    hf_hub_download(self.model, self.onnx_file), opts, providers=["CPUExecutionProvider"]
+                )
+                tokenizer = Tokenizer.from_pretrained(self.model)
+                tokenizer.enable_truncation(max_length=self.max_length)
+                tokenizer.enable_padding()
+                self._tokenizer = tokenizer
+                self._inputs = {i.name for i in self._session.get_inputs()}
+            except Exception as e:
+                logger.warning(
+                    "Reranker unavailable, keeping retrieval order; retrying in %ds: %s", self._retry_delay, e
+                )
+                self._session = None
+                self._retry_at = time.monotonic() + self._retry_delay
+                self._retry_delay = min(self._retry_delay * 2, RERANK_RETRY_MAX_S)
+        return self._session is not None
+
+    def _score(self, query, texts):
+        encodings = self._tokenizer.encode_batch([(query, t) for t in texts])
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        feeds = {k: v for k, v in feeds.items() if k in self._inputs}
+        logits = self._session.run(None, feeds)[0]
+        return logits.reshape(len(texts), -1)[:, 0].tolist()
+
+    def rerank(self, query: str, docs, top_n: int):
+        if len(docs) <= 1 or not self.load():
+            return docs[:top_n]
+        started = time.perf_counter()
+        qhash = hashlib.sha1(" ".join(query.lower().split()).encode("utf-8")).hexdigest()
+        keys = [(qhash, d.id or hashlib.sha1(d.page_content.encode("utf-8")).hexdigest()) for d in docs]
+
+        scores = {}
+        with self._cache_lock:
+            for key in keys:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    scores[key] = self._cache[key]
+        todo = [(key, d) for key, d in zip(keys, docs) if key not in scores]
+        if todo:
+            try:
+                new = self._score(query, [d.page_content for _, d in todo])
+            except Exception as e:
+                logger.warning("Reranking failed, keeping retrieval order: %s", e)
+                return docs[:top_n]
+            with self._cache_lock:
+                for (key, _), score in zip(todo, new):
+                    scores[key] = self._cache[key] = score
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        order = sorted(range(len(docs)), key=lambda i: scores[keys[i]], reverse=True)
+        logger.info(
+            "reranked %d chunks (%d scored) in %.1f ms",
+            len(docs), len(todo), (time.perf_counter() - started) * 1000,
+        )
+        return [docs[i] for i in order[:top_n]]
+
+
+reranker = CrossEncoderReranker()
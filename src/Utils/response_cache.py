@@ -0,0 +1,99 @@
+# response_cache.py
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from src.Utils.rag_config import (
+    RESPONSE_CACHE_SIZE,
+    RESPONSE_CACHE_THRESHOLD,
+    RESPONSE_CACHE_TTL,
+)
+
+
+def history_scope(summary: str, recent_messages: str, partition: str = "") -> str:
+    """
+    Cache scope for a query; answers are only reused within the same chat
+    context and, for users with their own documents, the same user partition.
+    """
+    if not summary and not recent_messages and not partition:
+        return ""
+    return hashlib.sha256(f"{summary}\x00{recent_messages}\x00{partition}".encode("utf-8")).hexdigest()
+
+
+class SemanticResponseCache:
+    """
+    Process-wide answer cache keyed on the query embedding.
+
+    A lookup hits when a stored query in the same scope and corpus version has
+    cosine similarity >= threshold. Entries expire after ttl seconds and the
+    least recently used one is evicted once maxsize is reached.
+    """
+
+    def __init__(self, maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL, threshold=RESPONSE_CACHE_THRESHOLD):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries = OrderedDict()  # key -> (vector, answer, scope, version, stored_at)
+        self._lock = threading.Lock()
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(vector):
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def _check_version(self, version):
+        # A new corpus makes every stored answer stale
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+
+    def get(self, vector, scope: str, version: str):
+        q = self._normalize(vector)
+        now = time.monotonic()
+        with self._lock:
+            self._check_version(version)
+            expired = [k for k, e in self._entries.items() if now - e[4] > self.ttl]
+            for k in expired:
+                del self._entries[k]
+            candidates = [(k, e) for k, e in self._entries.items() if e[2] == scope]
+            if candidates:
+                sims = np.stack([e[0] for _, e in candidates]) @ q
+                best = int(np.argmax(sims))
+                if sims[best] >= self.threshold:
+                    key = candidates[best][0]
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[key][1]
+            self.misses += 1
+            return None
+
+    def put(self, query: str, vector, scope: str, version: str, answer: str):
+        if not answer:
+            return
+        key = (scope, " ".join(query.lower().split()))
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = (self._normalize(vector), answer, scope, version, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+response_cache = SemanticResponseCache()
@@ -0,0 +1,219 @@
+# retrieval_benchmark.py
+"""
+Offline retrieval benchmark: runs the labelled question set through
+retrieve_main_corpus and appends recall@k, MRR, latency percentiles, peak
+memory and (optionally) index build time to a JSON history file.
+
+    python -m src.Utils.retrieval_benchmark [--ingest] [--tolerance 0.02]
+
+Exits non-zero if recall or MRR dropped against the last run on the same
+question set version.
+"""
+import os
+
+# Models must already be cached locally; never reach out to the hub mid-run
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+import argparse
+import json
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from src.Utils.rag_config import (
+    BENCHMARK_DIR,
+    CHUNK_OVERLAP,
+    CHUNK_SIZE,
+    EMBED_BACKEND,
+    EMBED_MODEL_NAME,
+    RERANK_CANDIDATES,
+    RERANK_TOP_N,
+    SYSTEM_CORPUS_DIR,
+    VECTOR_BACKEND,
+)
+
+QUESTIONS_PATH = BENCHMARK_DIR / "retrieval_questions.json"
+HISTORY_PATH = BENCHMARK_DIR / "retrieval_history.json"
+CUTOFFS = (1, 3, RERANK_TOP_N)
+
+
+def load_questions(path: Path = QUESTIONS_PATH) -> dict:
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def _relative_source(doc) -> str:
+    """Chunk's source file relative to system_knowledge, as used in the labels."""
+    path = Path(doc.metadata.get("path", ""))
+    try:
+        return path.relative_to(SYSTEM_CORPUS_DIR).as_posix()
+    except ValueError:
+        return path.as_posix()
+
+
+def ranked_sources(docs) -> list:
+    """Distinct source files in the order their first chunk was retrieved."""
+    seen = []
+    for doc in docs:
+        source = _relative_source(doc)
+        if source not in seen:
+            seen.append(source)
+    return seen
+
+
+def score(ranked: list, relevant: list) -> dict:
+    relevant = set(relevant)
+    result = {
+        f"recall@{k}": len(relevant & set(ranked[:k])) / len(relevant)
+        for k in CUTOFFS
+    }
+    rank = next((i + 1 for i, source in enumerate(ranked) if source in relevant), None)
+    result["rr"] = 1.0 / rank if rank else 0.0
+    return result
+
+
+def _percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run(questions: dict, ingest: bool = False) -> dict:
+    build_s = None
+    if ingest:
+        from src.Utils.main_corpus_ingestion import ingest as run_ingest
+
+        started = time.perf_counter()
+        run_ingest()
+        build_s = time.perf_counter() - started
+
+    from src.Utils.lazy_init import resource_timings
+    from src.Utils.main_corpus_retrieval import retrieve_main_corpus, warm_up_retrieval
+
+    started = time.perf_counter()
+    warm_up_retrieval()
+    load_s = time.perf_counter() - started
+
+    per_question, latencies = [], []
+    for item in questions["questions"]:
+        started = time.perf_counter()
+        docs = retrieve_main_corpus(item["question"])
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        latencies.append(elapsed_ms)
+        ranked = ranked_sources(docs)
+        per_question.append({
+            "id": item["id"],
+            "latency_ms": round(elapsed_ms, 1),
+            "retrieved": ranked,
+            **score(ranked, item["relevant"]),
+        })
+
+    metrics = {
+        key: round(statistics.mean(q[key] for q in per_question), 4)
+        for key in [f"recall@{k}" for k in CUTOFFS]
+    }
+    metrics["mrr"] = round(statistics.mean(q["rr"] for q in per_question), 4)
+    metrics["latency_p50_ms"] = round(_percentile(latencies, 0.50), 1)
+    metrics["latency_p95_ms"] = round(_percentile(latencies, 0.95), 1)
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "question_set": questions["version"],
+        "questions": len(per_question),
+        "config": {
+            "chunk_size": CHUNK_SIZE,
+            "chunk_overlap": CHUNK_OVERLAP,
+            "embed_model": EMBED_MODEL_NAME,
+            "embed_backend": EMBED_BACKEND,
+            "vector_backend": VECTOR_BACKEND,
+            "rerank_candidates": RERANK_CANDIDATES,
+            "rerank_top_n": RERANK_TOP_N,
+        },
+        "metrics": metrics,
+        "index_build_s": round(build_s, 2) if build_s is not None else None,
+        "index_load_s": round(load_s, 2),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "resources": resource_timings(),
+        "per_question": per_question,
+    }
+
+
+def load_history(path: Path = HISTORY_PATH) -> list:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return []
+
+
+def regressions(result: dict, history: list, tolerance: float) -> list:
+    """Quality metrics that fell by more than tolerance since the last comparable run."""
+    previous = next(
+        (run for run in reversed(history) if run.get("question_set") == result["question_set"]),
+        None,
+    )
+    if previous is None:
+        return []
+    return [
+        f"{key}: {previous['metrics'][key]:.3f} -> {value:.3f}"
+        for key, value in result["metrics"].items()
+        if not key.startswith("latency")
+        and key in previous["metrics"]
+        and previous["metrics"][key] - value > tolerance
+    ]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--ingest", action="store_true", help="rebuild the index first and time it")
+    parser.add_argument("--tolerance", type=float, default=0.02, help="allowed drop in recall/MRR")
+    parser.add_argument("--no-save", action="store_true", help="don't append to the history file")
+    args = parser.parse_args(argv)
+
+    result = run(load_questions(), ingest=args.ingest)
+    history = load_history()
+    failed = regressions(result, history, args.tolerance)
+
+    for key, value in result["metrics"].items():
+        print(f"{key:>16}: {value}")
+    print(f"{'index_load_s':>16}: {result['index_load_s']}")
+    if result["index_build_s"] is not None:
+        print(f"{'index_build_s':>16}: {result['index_build_s']}")
+    print(f"{'peak_rss_mb':>16}: {result['peak_rss_mb']}")
+    misses = [q["id"] for q in result["per_question"] if q["rr"] == 0.0]
+    if misses:
+        print(f"❌ No relevant document retrieved for: {', '.join(misses)}")
+
+    if not args.no_save:
+        HISTORY_PATH.parent.mkdir(parents=True, exist_ok=True)
+        HISTORY_PATH.write_text(json.dumps(history + [result], indent=2), encoding="utf-8")
+        print(f"📝 Appended to {HISTORY_PATH}")
+
+    if failed:
+        print("⚠️ Retrieval quality regressed: " + "; ".join(failed))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
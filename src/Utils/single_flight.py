@@ -0,0 +1,81 @@
+# single_flight.py
+import hashlib
+import threading
+
+from src.Utils.rag_config import SINGLE_FLIGHT_TIMEOUT
+
+
+def normalize_key(*parts) -> str:
+    """Case- and whitespace-insensitive key for a request."""
+    text = "\x00".join(" ".join(str(p).lower().split()) for p in parts)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Process-wide request coalescing.
+
+    The first caller for a key runs the work; concurrent callers with the same
+    key wait for it and get the same result (or the same exception).
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.shared = 0
+
+    def begin(self, key):
+        """Returns (call, is_leader). The leader must call finish()."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.shared += 1
+                return call, False
+            call = self._calls[key] = _Call()
+            return call, True
+
+    def finish(self, key, call, result=None, error=None):
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        if error is not None and not isinstance(error, Exception):
+            # A cancelled leader (GeneratorExit, KeyboardInterrupt, ...) must not
+            # propagate as-is into waiters, whose callers only catch Exception
+            error = RuntimeError(f"{self.name}: in-flight request cancelled")
+        call.result = result
+        call.error = error
+        call.done.set()
+
+    def wait(self, call, timeout=SINGLE_FLIGHT_TIMEOUT):
+        if not call.done.wait(timeout):
+            raise TimeoutError(f"{self.name}: timed out after {timeout}s waiting for in-flight request")
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def do(self, key, fn, *args, timeout=SINGLE_FLIGHT_TIMEOUT, **kwargs):
+        call, leader = self.begin(key)
+        if not leader:
+            return self.wait(call, timeout)
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self.finish(key, call, error=e)
+            raise
+        self.finish(key, call, result=result)
+        return result
+
+
+retrieval_flight = SingleFlight("retrieval")
+answer_flight = SingleFlight("answer")
+summary_flight = SingleFlight("summary")
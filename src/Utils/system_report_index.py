@@ -0,0 +1,181 @@
+# system_report_index.py
+import logging
+import statistics
+import threading
+
+from src.Utils.rag_config import (
+    REPORT_CPU_ALERT,
+    REPORT_DISK_ALERT,
+    REPORT_MEMORY_ALERT,
+    REPORT_TEMP_ALERT,
+    SYSTEM_REPORTS_DIR,
+)
+from src.Utils.user_docs import UserDocStore, retrieve_user_docs, user_partition
+
+logger = logging.getLogger(__name__)
+
+# Reports are indexed under their own partition, one chunk set per report id
+system_reports = UserDocStore(SYSTEM_REPORTS_DIR, source="system_report")
+
+# Only what the chunks need; recent_samples are never read
+_REPORT_COLUMNS = "id, created_at, conclusions, summary, aggregates:raw_data->data->aggregates"
+
+
+def _report_name(report_id) -> str:
+    return f"report-{report_id}"
+
+
+def _num(value):
+    return value if isinstance(value, (int, float)) else None
+
+
+def _fmt(value, unit="%"):
+    return f"{value:.1f}{unit}" if isinstance(value, (int, float)) else "n/a"
+
+
+def _mean(values):
+    values = [v for v in values if v is not None]
+    return statistics.mean(values) if values else None
+
+
+def _headline(date: str, aggregates) -> str:
+    cpu = [_num((a.get("cpu") or {}).get("avg")) for a in aggregates]
+    cpu_peak = [_num((a.get("cpu") or {}).get("max")) for a in aggregates]
+    memory = [_num(a.get("memory_avg_percent")) for a in aggregates]
+    disk = [_num(a.get("disk_avg_percent")) for a in aggregates]
+    temps = [_num((a.get("temps") or {}).get("avg_c")) for a in aggregates]
+    peak = max((v for v in cpu_peak + cpu if v is not None), default=None)
+    return (
+        f"System report {date} rollup over {len(aggregates)} windows: "
+        f"CPU average {_fmt(_mean(cpu))} (peak {_fmt(peak)}), "
+        f"memory average {_fmt(_mean(memory))}, disk usage {_fmt(_mean(disk))}, "
+        f"temperature average {_fmt(_mean(temps), ' °C')} "
+        f"(max {_fmt(max((t for t in temps if t is not None), default=None), ' °C')})."
+    )
+
+
+def _anomalies(date: str, aggregates) -> str:
+    checks = [
+        ("CPU", lambda a: _num((a.get("cpu") or {}).get("avg")), REPORT_CPU_ALERT, "%"),
+        ("memory", lambda a: _num(a.get("memory_avg_percent")), REPORT_MEMORY_ALERT, "%"),
+        ("disk", lambda a: _num(a.get("disk_avg_percent")), REPORT_DISK_ALERT, "%"),
+        ("temperature", lambda a: _num((a.get("temps") or {}).get("avg_c")), REPORT_TEMP_ALERT, " °C"),
+    ]
+    lines = []
+    for label, read, limit, unit in checks:
+        hot = [(a, read(a)) for a in aggregates if (read(a) or 0) >= limit]
+        if hot:
+            worst, value = max(hot, key=lambda h: h[1])
+            start = (worst.get("window") or {}).get("start", "")
+            lines.append(
+                f"- High {label}: {len(hot)} of {len(aggregates)} windows at or above "
+                f"{limit}{unit}, worst {_fmt(value, unit)} at {start}"
+            )
+    if not lines:
+        return ""
+    return f"System report {date} anomalies:\n" + "\n".join(lines)
+
+
+def _peak_period(date: str, peak: dict) -> str:
+    if not peak:
+        return ""
+    lines = [f"System report {date} peak activity period."]
+    top = peak.get("top_aggregate") or {}
+    if top:
+        cpu = top.get("cpu") or {}
+        temps = top.get("temps") or {}
+        lines.append(
+            f"During the peak: CPU average {_fmt(_num(cpu.get('avg')))}, "
+            f"memory {_fmt(_num(top.get('memory_avg_percent')))}, "
+            f"disk {_fmt(_num(top.get('disk_avg_percent')))}"
+            + (f", temperature {_fmt(_num(temps.get('avg_c')), ' °C')}" if temps.get("available") else "")
+            + "."
+        )
+    processes = peak.get("top_processes") or []
+    if processes:
+        lines.append("Top processes:")
+        for proc in processes[:5]:
+            if isinstance(proc, dict):
+                lines.append("- " + ", ".join(f"{k}: {v}" for k, v in proc.items()))
+            else:
+                lines.append(f"- {proc}")
+    return "\n".join(lines)
+
+
+def report_chunks(report: dict):
+    """Compact (text, kind) chunks for one report: rollup, anomalies, peak period, conclusions."""
+    date = (report.get("created_at") or "")[:10]
+    aggregates = [a for a in (report.get("aggregates") or []) if isinstance(a, dict)]
+    summary = report.get("summary") or {}
+    chunks = []
+    if aggregates:
+        chunks.append((_headline(date, aggregates), "headline"))
+        anomalies = _anomalies(date, aggregates)
+        if anomalies:
+            chunks.append((anomalies, "anomalies"))
+    peak = _peak_period(date, summary.get("peak_active_period") or {})
+    if peak:
+        chunks.append((peak, "top_processes"))
+    conclusions = (report.get("conclusions") or "").strip()
+    if conclusions:
+        chunks.append((f"System report {date} conclusions:\n{conclusions}", "conclusions"))
+    return chunks
+
+
+def index_report(email: str, report: dict) -> int:
+    chunks = report_chunks(report)
+    if not chunks:
+        return 0
+    date = (report.get("created_at") or "")[:10]
+    return system_reports.add_chunks(
+        email,
+        _report_name(report["id"]),
+        [text for text, _ in chunks],
+        [{"kind": kind, "topic": f"system report {date}"} for _, kind in chunks],
+    )
+
+
+def sync_reports(sb, email: str, report_ids):
+    """
+    Embeds reports that are not indexed yet and drops deleted ones; reports
+    already indexed are never fetched again.
+    """
+    wanted = {_report_name(rid): rid for rid in report_ids}
+    indexed = set(system_reports.documents(email))
+    for name in indexed - set(wanted):
+        system_reports.remove(email, name)
+    missing = [rid for name, rid in wanted.items() if name not in indexed]
+    if not missing:
+        return 0
+    rows = (
+        sb.table("user_system_reports")
+        .select(_REPORT_COLUMNS)
+        .eq("user_email", email)
+        .in_("id", missing)
+        .execute()
+    ).data or []
+    added = 0
+    for report in rows:
+        try:
+            added += index_report(email, report)
+        except Exception as e:
+            logger.warning("Could not index report %s for %s: %s", report.get("id"), email, e)
+    return added
+
+
+def sync_in_background(sb, email: str, report_ids):
+    def _run():
+        try:
+            sync_reports(sb, email, report_ids)
+        except Exception as e:
+            logger.warning("System report sync failed for %s: %s", email, e)
+    threading.Thread(target=_run, name="report-index", daemon=True).start()
+
+
+def report_partition(user: str) -> str:
+    return user_partition(user, system_reports)
+
+
+def retrieve_system_data(user: str, query: str):
+    """The user's report chunks that match the query; empty if they have no reports."""
+    return retrieve_user_docs(user, query, system_reports)
@@ -0,0 +1,252 @@
+# user_docs.py
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from src.Utils.lazy_init import LazyResource
+from src.Utils.rag_config import (
+    CHUNK_OVERLAP,
+    CHUNK_SIZE,
+    USER_DOCS_DIR,
+    USER_DOCS_MAX_BYTES,
+    USER_DOCS_MIN_SCORE,
+    USER_DOCS_TOP_K,
+    USER_PARTITION_CACHE_SIZE,
+    embeddings,
+)
+from src.Utils.vector_index import NumpyVectorIndex
+
+logger = logging.getLogger(__name__)
+
+
+def _load_chroma():
+    import chromadb
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    return chromadb, RecursiveCharacterTextSplitter
+
+
+def _collection_name(user: str) -> str:
+    # One collection per tenant, so a search never scans other users' chunks
+    return "user_" + hashlib.sha256(user.encode("utf-8")).hexdigest()[:32]
+
+
+def _chunk_id(name: str, index: int, text: str) -> str:
+    return hashlib.sha256(f"{name}\x00{index}\x00{text}".encode("utf-8")).hexdigest()
+
+
+class _Partition:
+    """A tenant's chunks as an immutable matrix index, plus a version for cache scoping."""
+
+    def __init__(self, index, version: str):
+        self.index = index
+        self.version = version
+
+
+_EMPTY = _Partition(None, "")
+
+
+def _make_partition(ids, vectors, texts, metadatas) -> _Partition:
+    if not ids:
+        return _EMPTY
+    version = hashlib.sha256("\x00".join(sorted(ids)).encode("utf-8")).hexdigest()[:16]
+    return _Partition(NumpyVectorIndex(ids, vectors, tuple(texts), metadatas), version)
+
+
+class UserDocStore:
+    """
+    Per-user document partitions: one Chroma collection per user under path,
+    and an LRU of the hot tenants' partitions loaded as NumpyVectorIndex.
+
+    Uploads are chunked and only new chunks are embedded. A write patches the
+    tenant's cached partition (a new index, never an in-place change) rather
+    than reloading it; cold tenants are evicted once more than maxsize are
+    loaded.
+    """
+
+    def __init__(self, path, source: str = "user_docs", maxsize: int = USER_PARTITION_CACHE_SIZE):
+        self.path = path
+        self.source = source
+        self.maxsize = maxsize
+        self._store = LazyResource(source, load=_load_chroma, build=self._build)
+        self._partitions = OrderedDict()  # user -> _Partition
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._generation = 0  # bumped on every write, so a load racing one isn't cached
+
+    def _build(self, loaded):
+        chromadb, Splitter = loaded
+        self.path.mkdir(parents=True, exist_ok=True)
+        client = chromadb.PersistentClient(path=str(self.path))
+        return client, Splitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+
+    def _collection(self, user: str, create: bool = False):
+        client, _ = self._store.get()
+        name = _collection_name(user)
+        if create:
+            return client.get_or_create_collection(name)
+        try:
+            return client.get_collection(name)
+        except Exception:
+            return None
+
+    def _load(self, user: str) -> _Partition:
+        collection = self._collection(user)
+        if collection is None:
+            return _EMPTY
+        data = collection.get(include=["embeddings", "documents", "metadatas"])
+        return _make_partition(data["ids"], data["embeddings"], data["documents"], data["metadatas"])
+
+    def partition(self, user: str) -> _Partition:
+        with self._lock:
+            part = self._partitions.get(user)
+            if part is not None:
+                self._partitions.move_to_end(user)
+                return part
+            generation = self._generation
+        part = self._load(user)
+        with self._lock:
+            if generation != self._generation:
+                return part
+            self._partitions[user] = part
+            self._partitions.move_to_end(user)
+            while len(self._partitions) > self.maxsize:
+                self._partitions.popitem(last=False)
+        return part
+
+    def _invalidate(self, user: str):
+        with self._lock:
+            self._generation += 1
+            self._partitions.pop(user, None)
+
+    def _patch(self, user: str, removed: set, ids, vectors, texts, metadatas):
+        """
+        Applies a write to the user's cached partition without reading the
+        collection back; a tenant that isn't loaded is simply left cold.
+        """
+        with self._lock:
+            self._generation += 1
+            part = self._partitions.get(user)
+            if part is None:
+                return
+            old = part.index
+            keep = [i for i, chunk_id in enumerate(old.ids) if chunk_id not in removed] if old else []
+            rows = [old.matrix[keep]] if keep else []
+            if ids:
+                rows.append(np.asarray(vectors, dtype=np.float32))
+            self._partitions[user] = _make_partition(
+                [old.ids[i] for i in keep] + list(ids),
+                np.vstack(rows) if rows else np.zeros((0, 0), dtype=np.float32),
+                [old.texts[i] for i in keep] + list(texts),
+                [old.metadatas[i] for i in keep] + list(metadatas),
+            )
+
+    def version(self, user: str) -> str:
+        """Changes whenever the user's documents do; "" if they have none."""
+        return self.partition(user).version
+
+    def add(self, user: str, name: str, text: str) -> int:
+        """Indexes (or re-indexes) one document; returns how many chunks were embedded."""
+        _, splitter = self._store.get()
+        return self.add_chunks(user, name, splitter.split_text(text))
+
+    def add_chunks(self, user: str, name: str, chunks, metadatas=None) -> int:
+        """Replaces the chunks stored under name, embedding only those not stored yet."""
+        metadatas = metadatas or [{} for _ in chunks]
+        ids = [_chunk_id(name, i, chunk) for i, chunk in enumerate(chunks)]
+        with self._write_lock:
+            collection = self._collection(user, create=True)
+            existing = set(collection.get(where={"path": name}, include=[])["ids"])
+            new = [(i, chunk_id) for i, chunk_id in enumerate(ids) if chunk_id not in existing]
+            new_ids = [chunk_id for _, chunk_id in new]
+            texts = [chunks[i] for i, _ in new]
+            vectors = embeddings.embed_documents(texts) if new else []
+            new_metadatas = [
+                {
+                    "source": self.source,
+                    "domain": self.source,
+                    "topic": name,
+                    **metadatas[i],
+                    "path": name,
+                    "chunk_index": i,
+                }
+                for i, _ in new
+            ]
+            if new:
+                collection.upsert(ids=new_ids, embeddings=vectors, documents=texts, metadatas=new_metadatas)
+            stale = existing - set(ids)
+            if stale:
+                collection.delete(ids=list(stale))
+            if new or stale:
+                self._patch(user, stale, new_ids, vectors, texts, new_metadatas)
+        logger.info("Indexed %s/%s for %s: %d chunks, %d new", self.source, name, user, len(ids), len(new))
+        return len(new)
+
+    def remove(self, user: str, name: str):
+        with self._write_lock:
+            collection = self._collection(user)
+            if collection is not None:
+                collection.delete(where={"path": name})
+            self._invalidate(user)
+
+    def documents(self, user: str) -> list:
+        """Names of the user's indexed documents."""
+        part = self.partition(user)
+        if part.index is None:
+            return []
+        return sorted({meta["path"] for meta in part.index.metadatas})
+
+    def has(self, user: str, name: str, chunks) -> bool:
+        """True if exactly these chunks are already indexed under name."""
+        part = self.partition(user)
+        stored = {
+            chunk_id for chunk_id, meta in zip(part.index.ids, part.index.metadatas)
+            if meta.get("path") == name
+        } if part.index else set()
+        return stored == {_chunk_id(name, i, chunk) for i, chunk in enumerate(chunks)}
+
+    def search(self, user: str, query: str, k: int = USER_DOCS_TOP_K, min_score: float = USER_DOCS_MIN_SCORE):
+        part = self.partition(user)
+        if part.index is None:
+            return []
+        # Same cached query vector the main corpus search uses
+        return part.index.documents(embeddings.vector(query), k, min_score=min_score)
+
+
+user_docs = UserDocStore(USER_DOCS_DIR)
+
+
+def user_partition(user: str, store: UserDocStore = user_docs) -> str:
+    """Cache scope part for the user's partition in store; "" when it is empty."""
+    if not user or user == "anonymous":
+        return ""
+    try:
+        version = store.version(user)
+    except Exception as e:
+        logger.warning("%s lookup failed for %s: %s", store.source, user, e)
+        return ""
+    return f"{store.source}:{user}:{version}" if version else ""
+
+
+def retrieve_user_docs(user: str, query: str, store: UserDocStore = user_docs):
+    """Best matching chunks from the user's partition in store (empty if they have none)."""
+    if not user or user == "anonymous":
+        return []
+    try:
+        return store.search(user, query)
+    except Exception as e:
+        logger.warning("%s search failed for %s: %s", store.source, user, e)
+        return []
+
+
+def index_upload(user: str, name: str, data: bytes) -> int:
+    """Indexes an uploaded text file into the user's partition."""
+    if len(data) > USER_DOCS_MAX_BYTES:
+        raise ValueError(f"{name} is larger than {USER_DOCS_MAX_BYTES // (1024 * 1024)} MB")
+    text = data.decode("utf-8", errors="replace").strip()
+    if not text:
+        raise ValueError(f"{name} has no text to index")
+    return user_docs.add(user, name, text)
@@ -0,0 +1,91 @@
+# vector_index.py
+import numpy as np
+from langchain_core.documents import Document
+
+# Metadata fields the query analyzer filters on; masks for these are precomputed
+FILTER_FIELDS = ("source", "os", "distro", "domain")
+
+
+class NumpyVectorIndex:
+    """
+    Exact cosine top-k over an in-memory corpus.
+
+    Embeddings are L2-normalized into one contiguous, read-only float32
+    matrix, so a search is one matrix-vector product plus argpartition.
+    Metadata filters are boolean masks, precomputed per (field, value) for
+    FILTER_FIELDS. Nothing is mutated after construction, so one instance
+    can be shared by every session thread without locking.
+
+    vectors may be a read-only memory map; with normalized=True it is used
+    as-is rather than copied. texts can be any indexable sequence.
+    """
+
+    def __init__(self, ids, vectors, texts, metadatas, filter_fields=FILTER_FIELDS, normalized=False):
+        if vectors is None or (not len(ids) and not len(vectors)):
+            # An empty collection returns [] (or None), not a (0, dim) matrix
+            vectors = np.zeros((0, 0), dtype=np.float32)
+        matrix = np.ascontiguousarray(vectors, dtype=np.float32)
+        if matrix.ndim != 2 or len(matrix) != len(ids):
+            raise ValueError(f"Expected {len(ids)} embedding rows, got shape {matrix.shape}")
+        if not normalized:
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix = matrix / np.where(norms == 0, 1.0, norms)
+        matrix.setflags(write=False)
+        self.matrix = matrix
+        self.ids = tuple(ids)
+        self.texts = texts
+        self.metadatas = tuple(metadatas)
+        self._masks = {}
+        for field in filter_fields:
+            values = np.array([meta.get(field) for meta in self.metadatas], dtype=object)
+            for value in set(values.tolist()) - {None}:
+                mask = values == value
+                mask.setflags(write=False)
+                self._masks[(field, value)] = mask
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_collection(cls, data: dict):
+        """From a Chroma get(include=["embeddings", "documents", "metadatas"]) result."""
+        return cls(data["ids"], data["embeddings"], tuple(data["documents"]), data["metadatas"])
+
+    def _mask(self, fields: dict):
+        mask = None
+        for field, value in fields.items():
+            part = self._masks.get((field, value))
+            if part is None:
+                part = np.fromiter(
+                    (meta.get(field) == value for meta in self.metadatas),
+                    dtype=bool,
+                    count=len(self.metadatas),
+                )
+            mask = part if mask is None else mask & part
+        return mask
+
+    def search(self, vector, k: int, fields=None):
+        """Top-k (row, cosine score), best first; fields restricts metadata by equality."""
+        if not len(self.ids) or k <= 0:
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        scores = self.matrix @ (query / norm if norm else query)
+        mask = self._mask(fields) if fields else None
+        if mask is not None:
+            allowed = int(mask.sum())
+            if not allowed:
+                return []
+            scores = np.where(mask, scores, -np.inf)
+            k = min(k, allowed)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top]
+
+    def documents(self, vector, k: int, fields=None, min_score=None):
+        return [
+            Document(id=self.ids[i], page_content=self.texts[i], metadata=dict(self.metadatas[i]))
+            for i, score in self.search(vector, k, fields)
+            if min_score is None or score >= min_score
+        ]
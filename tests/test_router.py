@@ -0,0 +1,38 @@
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("streamlit")
+pytest.importorskip("langchain_core")
+
+from src.Utils.rag_app import _is_small_talk, route_query
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "hey how do I fix my wifi?",
+        "hi, wifi keeps dropping",
+        "ok, my nvidia screen flickers",
+        "thanks, but bluetooth won't pair",
+        "great, now audio is broken",
+    ],
+)
+def test_question_after_pleasantry_is_not_small_talk(query):
+    assert not _is_small_talk(query)
+    # New chat: no history, so nothing can send it to the light tier
+    assert route_query(query, None, has_history=False) == "full"
+
+
+@pytest.mark.parametrize(
+    "query",
+    ["hello", "hi there", "thanks a lot!", "ok got it", "thank you, that worked", "good morning!"],
+)
+def test_pure_small_talk_is_light(query):
+    assert _is_small_talk(query)
+    assert route_query(query, None, has_history=False) == "light"
+
+
+@pytest.mark.parametrize("query", ["does that fix the battery drain?", "is it the tlp service?"])
+def test_technical_follow_up_is_full(query):
+    # Decided before any similarity lookup, so no vector is needed
+    assert route_query(query, None, has_history=True) == "full"